@@ -0,0 +1,88 @@
+"""
+Offline replay of the fee strategies over a recorded eth_feeHistory.
+
+Record the last blocks of an endpoint once (eth_feeHistory returns at most 1024 blocks per call):
+
+    python benchmarks/fee_replay.py record --rpc_url https://polygon-rpc.com --blocks 1024 --output history.json
+
+then replay every strategy over it without any network access:
+
+    python benchmarks/fee_replay.py replay --history history.json
+
+At every block the strategy is quoted from the previous `--window` blocks. The transaction is considered included in
+the first following block whose base fee is under its maxFeePerGas and whose lowest recorded reward is under its
+priority fee. The report gives, per strategy, the share included within its target, the median latency in blocks,
+and the average price paid and reserved per gas.
+"""
+import json
+import os
+import statistics
+import sys
+
+import click
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import FEE_STRATEGIES, REWARD_PERCENTILES, parse_fee_history, quote_fees  # noqa: E402
+
+
+def replay_strategy(fee_history: dict, strategy: str, window: int, min_priority_fee: int) -> dict:
+    base_fees, rewards = fee_history['base_fees'], fee_history['rewards']
+    target_blocks = FEE_STRATEGIES[strategy]['target_blocks']
+    latencies, paid, reserved, in_target, quoted = [], [], [], 0, 0
+    for block in range(window, len(rewards)):
+        quote = quote_fees({'base_fees': base_fees[block - window:block + 1], 'rewards': rewards[block - window:block]},
+                           strategy, min_priority_fee)
+        quoted += 1
+        for included_block in range(block, len(rewards)):
+            base_fee = base_fees[included_block]
+            if quote['maxFeePerGas'] >= base_fee and quote['maxPriorityFeePerGas'] >= rewards[included_block][0]:
+                latency = included_block - block
+                latencies.append(latency)
+                in_target += latency < target_blocks
+                paid.append(base_fee + min(quote['maxPriorityFeePerGas'], quote['maxFeePerGas'] - base_fee))
+                reserved.append(quote['maxFeePerGas'])
+                break
+    return {
+        'strategy': strategy,
+        'quotes': quoted,
+        'included': len(latencies),
+        'included_within_target': in_target / quoted if quoted else None,
+        'median_latency_blocks': statistics.median(latencies) if latencies else None,
+        'avg_paid_gwei': statistics.mean(paid) / 10 ** 9 if paid else None,
+        'avg_max_fee_gwei': statistics.mean(reserved) / 10 ** 9 if reserved else None,
+    }
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.option('--rpc_url', required=True)
+@click.option('--blocks', default=1024)
+@click.option('--output', required=True)
+def record(rpc_url, blocks, output):
+    response = requests.post(rpc_url, json={'jsonrpc': '2.0', 'id': 1, 'method': 'eth_feeHistory',
+                                            'params': [hex(blocks), 'latest', REWARD_PERCENTILES]})
+    response.raise_for_status()
+    with open(output, 'w') as stream:
+        json.dump(response.json()['result'], stream)
+
+
+@main.command()
+@click.option('--history', required=True, help='eth_feeHistory result recorded with the record command')
+@click.option('--window', default=20, help='blocks of history used by every quote')
+@click.option('--min_priority_fee_gwei', default=30.0)
+def replay(history, window, min_priority_fee_gwei):
+    with open(history, 'r') as stream:
+        fee_history = parse_fee_history(json.load(stream))
+    results = [replay_strategy(fee_history, strategy, window, int(min_priority_fee_gwei * 10 ** 9))
+               for strategy in FEE_STRATEGIES]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""
+End-to-end benchmark of `collect_earning` against a local stand-in chain and vault, for regression tracking.
+
+The stand-in chain is a JSON-RPC server emulating the operator contract: getSponsorshipsAndEarnings returns the
+sponsorships of the scenario, withdrawEarningsFromSponsorships is estimated and charged a fixed base gas plus gas per
+sponsorship, and signed transactions are decoded, mined on send with a Profit event and their earnings zeroed. Every
+HTTP request to the chain is delayed by `--latency_ms`. Each scenario reports wall time, rpc round trips and requests,
+bytes on the wire (request and response bodies) and gas used, as one JSON document.
+
+    python benchmarks/harvest.py --sponsorships 1,10,100 --operators 1,10,50 --latency_ms 50 --output results.json
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account._utils.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harvest_sponsorship import collect_earning  # noqa: E402
+
+CHAIN_ID = 137
+BASE_FEE = 100 * 10 ** 9
+PRIORITY_FEE = 30 * 10 ** 9
+CLAIM_BASE_GAS = 60000
+CLAIM_GAS_PER_SPONSORSHIP = 40000
+QUEUE_PAYOUT_GAS = 70000
+MAX_QUEUE_PAYOUT_ITERATIONS = 5
+STREAMR_CONFIG = '0x{:040x}'.format(0xc0 << 152)
+MAX_ALLOWED_EARNINGS = 10 ** 24
+WALLET_BALANCE = 100 * 10 ** 18
+# shares of the withdrawn earnings reported as operator's cut and protocol fee by the Profit event
+OPERATORS_CUT = 0.1
+PROTOCOL_FEE = 0.05
+
+
+def selector(signature: str) -> str:
+    return Web3.keccak(text=signature)[:4].hex()[2:]
+
+
+GET_SPONSORSHIPS_AND_EARNINGS = selector('getSponsorshipsAndEarnings()')
+WITHDRAW_EARNINGS = selector('withdrawEarningsFromSponsorships(address[])')
+WITHDRAW_EARNINGS_WITHOUT_QUEUE = selector('withdrawEarningsFromSponsorshipsWithoutQueue(address[])')
+PAY_OUT_QUEUE = selector('payOutQueue(uint256)')
+QUEUE_CURRENT_INDEX = selector('queueCurrentIndex()')
+QUEUE_LAST_INDEX = selector('queueLastIndex()')
+STREAMR_CONFIG_ADDRESS = selector('streamrConfig()')
+MAX_QUEUE_PAYOUT_ITERATIONS_VIEW = selector('maxQueuePayoutIterations()')
+PROFIT_TOPIC = Web3.keccak(text='Profit(uint256,uint256,uint256)').hex()
+
+
+class RpcError(Exception):
+    pass
+
+
+class StandInChain:
+    """
+    Chain state shared by the rpc handler threads: operator earnings and undelegation queue lengths, wallet nonces
+    and mined receipts. The default withdraw pays out up to MAX_QUEUE_PAYOUT_ITERATIONS queue entries.
+    """
+
+    def __init__(self, earnings: dict, queue_lengths: dict = None):
+        self.earnings = earnings
+        self.queue_lengths = queue_lengths or {}
+        self.nonces = {}
+        self.receipts = {}
+        self.block_number = 1
+        self.base_fee = BASE_FEE
+        self.round_trips = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.gas_used = 0
+        self._lock = threading.Lock()
+
+    def execute(self, call: dict, apply: bool = False) -> tuple:
+        """Gas used by a withdraw or payOutQueue `call` and the DATA withdrawn, the state changes when `apply`."""
+        data = call.get('data') or call.get('input')
+        address = Web3.to_checksum_address(call['to'])
+        queue_length = self.queue_lengths.get(address, 0)
+        if data[2:10] == PAY_OUT_QUEUE:
+            (iterations,) = decode(['uint256'], bytes.fromhex(data[10:]))
+            paid_out = min(iterations, queue_length)
+            if apply:
+                self.queue_lengths[address] = queue_length - paid_out
+            return CLAIM_BASE_GAS + QUEUE_PAYOUT_GAS * paid_out, 0
+        if data[2:10] not in (WITHDRAW_EARNINGS, WITHDRAW_EARNINGS_WITHOUT_QUEUE):
+            raise RpcError("unknown method {}".format(data[:10]))
+        (sponsorships,) = decode(['address[]'], bytes.fromhex(data[10:]))
+        operator = self.earnings.get(address)
+        if operator is None:
+            raise RpcError("execution reverted")
+        sponsorships = [Web3.to_checksum_address(sponsorship) for sponsorship in sponsorships]
+        if any(not operator.get(sponsorship) for sponsorship in sponsorships):
+            raise RpcError("execution reverted: NoEarnings")
+        paid_out = min(queue_length, MAX_QUEUE_PAYOUT_ITERATIONS) if data[2:10] == WITHDRAW_EARNINGS else 0
+        withdrawn = sum(operator[sponsorship] for sponsorship in sponsorships)
+        if apply:
+            self.queue_lengths[address] = queue_length - paid_out
+            for sponsorship in sponsorships:
+                operator[sponsorship] = 0
+        return CLAIM_BASE_GAS + CLAIM_GAS_PER_SPONSORSHIP * len(sponsorships) + QUEUE_PAYOUT_GAS * paid_out, withdrawn
+
+    def call(self, call: dict) -> str:
+        method = call['data'][2:10]
+        if method == GET_SPONSORSHIPS_AND_EARNINGS:
+            operator = self.earnings.get(Web3.to_checksum_address(call['to']))
+            if operator is None:
+                raise RpcError("execution reverted")
+            return '0x' + encode(['address[]', 'uint256[]', 'uint256'],
+                                 [list(operator), list(operator.values()), MAX_ALLOWED_EARNINGS]).hex()
+        if method in (QUEUE_CURRENT_INDEX, QUEUE_LAST_INDEX):
+            queue_length = self.queue_lengths.get(Web3.to_checksum_address(call['to']), 0)
+            return '0x' + encode(['uint256'], [100 + (queue_length if method == QUEUE_LAST_INDEX else 0)]).hex()
+        if method == STREAMR_CONFIG_ADDRESS:
+            return '0x' + encode(['address'], [STREAMR_CONFIG]).hex()
+        if method == MAX_QUEUE_PAYOUT_ITERATIONS_VIEW:
+            return '0x' + encode(['uint256'], [MAX_QUEUE_PAYOUT_ITERATIONS]).hex()
+        _, withdrawn = self.execute(call)
+        return '0x' + encode(['uint256'], [withdrawn]).hex() if method == WITHDRAW_EARNINGS_WITHOUT_QUEUE else '0x'
+
+    def send_raw_transaction(self, raw: str) -> str:
+        transaction = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+        sender = Account.recover_transaction(raw)
+        if transaction['nonce'] != self.nonces.get(sender, 0):
+            raise RpcError("nonce too low" if transaction['nonce'] < self.nonces.get(sender, 0) else "nonce gap")
+        call = {'to': Web3.to_hex(transaction['to']), 'data': Web3.to_hex(transaction['data'])}
+        gas_used, withdrawn = self.execute(call, apply=True)
+        self.nonces[sender] = transaction['nonce'] + 1
+        self.block_number += 1
+        self.gas_used += gas_used
+        tx_hash = Web3.keccak(hexstr=raw).hex()
+        gas_price = min(transaction['maxFeePerGas'], self.base_fee + transaction['maxPriorityFeePerGas'])
+        self.receipts[tx_hash] = {
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockNumber': hex(self.block_number),
+            'blockHash': '0x' + '00' * 32, 'from': sender, 'to': call['to'], 'cumulativeGasUsed': hex(gas_used),
+            'gasUsed': hex(gas_used), 'effectiveGasPrice': hex(gas_price),
+            'contractAddress': None, 'logs': self.profit_logs(call['to'], withdrawn, tx_hash),
+            'logsBloom': '0x' + '00' * 256, 'status': '0x1', 'type': '0x2',
+        }
+        return tx_hash
+
+    def profit_logs(self, operator: str, withdrawn: int, tx_hash: str) -> list:
+        if not withdrawn:
+            return []
+        operators_cut, protocol_fee = int(withdrawn * OPERATORS_CUT), int(withdrawn * PROTOCOL_FEE)
+        return [{
+            'address': operator,
+            'topics': [PROFIT_TOPIC, '0x{:064x}'.format(operators_cut), '0x{:064x}'.format(protocol_fee)],
+            'data': '0x{:064x}'.format(withdrawn - operators_cut - protocol_fee), 'blockNumber': hex(self.block_number),
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockHash': '0x' + '00' * 32, 'logIndex': '0x0',
+            'removed': False,
+        }]
+
+    def handle(self, method: str, params: list):
+        if method == 'eth_chainId':
+            return hex(CHAIN_ID)
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_feeHistory':
+            blocks = int(params[0], 16) if isinstance(params[0], str) else params[0]
+            return {'oldestBlock': hex(self.block_number), 'baseFeePerGas': [hex(self.base_fee)] * (blocks + 1),
+                    'gasUsedRatio': [0.5] * blocks, 'reward': [[hex(PRIORITY_FEE)] * len(params[2])] * blocks}
+        if method == 'eth_getBalance':
+            return hex(WALLET_BALANCE)
+        if method == 'eth_getTransactionCount':
+            return hex(self.nonces.get(Web3.to_checksum_address(params[0]), 0))
+        if method == 'eth_call':
+            return self.call(params[0])
+        if method == 'eth_estimateGas':
+            return hex(self.execute(params[0])[0])
+        if method == 'eth_sendRawTransaction':
+            return self.send_raw_transaction(params[0])
+        if method == 'eth_getTransactionReceipt':
+            return self.receipts.get(params[0])
+        raise RpcError("method {} not supported".format(method))
+
+    def handle_request(self, request: dict) -> dict:
+        with self._lock:
+            self.requests += 1
+            try:
+                return {'jsonrpc': '2.0', 'id': request['id'], 'result': self.handle(request['method'],
+                                                                                    request['params'])}
+            except RpcError as error:
+                return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': -32000, 'message': str(error)}}
+
+
+def serve(handler_class) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status: int, payload) -> int:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def log_message(self, *args):
+        pass
+
+
+def start_chain(chain: StandInChain, latency: float) -> ThreadingHTTPServer:
+    class ChainHandler(JsonHandler):
+        def do_POST(self):
+            body = self.read_body()
+            time.sleep(latency)
+            payload = json.loads(body)
+            if isinstance(payload, list):
+                response = [chain.handle_request(request) for request in payload]
+            else:
+                response = chain.handle_request(payload)
+            sent = self.send_json(200, response)
+            with chain._lock:
+                chain.round_trips += 1
+                chain.bytes_received += len(body)
+                chain.bytes_sent += sent
+
+    return serve(ChainHandler)
+
+
+def start_vault(keys: dict) -> ThreadingHTTPServer:
+    """Userpass login and KV v2 reads of the signing keys, `keys` by vault_key."""
+    class VaultHandler(JsonHandler):
+        def do_POST(self):
+            self.read_body()
+            self.send_json(200, {'auth': {'client_token': 'benchmark', 'lease_duration': 3600, 'renewable': True}})
+
+        def do_GET(self):
+            self.send_json(200, {'lease_duration': 0, 'data': {'data': keys}})
+
+    return serve(VaultHandler)
+
+
+def run_scenario(sponsorship_count: int, operator_count: int, latency: float, queue_length: int = 0,
+                 settings: dict = None, shared_wallet: bool = False) -> dict:
+    """Harvest against the stand-in chain, every operator signing with its own wallet or all with `shared_wallet`."""
+    earnings, operators, keys = {}, [], {}
+    for operator_index in range(operator_count):
+        operator = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152 | operator_index))
+        earnings[operator] = {Web3.to_checksum_address('0x{:040x}'.format(0x5b << 152 | operator_index << 32 | index)):
+                              (index + 1) * 10 ** 18 for index in range(sponsorship_count)}
+        keys['key{}'.format(operator_index)] = '0x{:064x}'.format(operator_index + 1)
+        operators.append({'operator_contract_adress': operator,
+                          'vault_key': 'key{}'.format(0 if shared_wallet else operator_index)})
+
+    chain = StandInChain(earnings, {operator['operator_contract_adress']: queue_length for operator in operators})
+    chain_server, vault_server = start_chain(chain, latency), start_vault(keys)
+    with tempfile.TemporaryDirectory() as directory:
+        cfg = {
+            'rpc_url': 'http://127.0.0.1:{}'.format(chain_server.server_address[1]),
+            'vault_enabled': True,
+            # a new vault address per scenario, so that no scenario reuses the cached token of the previous one
+            'vault_address': 'http://127.0.0.1:{}'.format(vault_server.server_address[1]),
+            'vault_username': 'benchmark',
+            'vault_mount_point': 'secret',
+            'vault_secret_path': 'harvest',
+            'journal_path': os.path.join(directory, 'journal.sqlite'),
+            'tx_poll_interval': 0.01,
+            'operators': operators,
+            **(settings or {}),
+        }
+        started_at = time.perf_counter()
+        reports = collect_earning(cfg)
+        elapsed = time.perf_counter() - started_at
+    chain_server.shutdown()
+    vault_server.shutdown()
+    return {
+        'sponsorships': sponsorship_count,
+        'operators': operator_count,
+        'shared_wallet': shared_wallet,
+        'queue_length': queue_length,
+        'latency_ms': latency * 1000,
+        'wall_time_s': elapsed,
+        'round_trips': chain.round_trips,
+        'rpc_requests': chain.requests,
+        'bytes_sent': chain.bytes_received,
+        'bytes_received': chain.bytes_sent,
+        'gas_used': chain.gas_used,
+        'transactions': sum(len(report['tx_hashes']) for report in reports),
+        'harvested': sum(report['status'] == 'harvested' for report in reports),
+    }
+
+
+@click.command()
+@click.option('--sponsorships', default='1,10,100', help='comma separated sponsorship counts per operator')
+@click.option('--operators', default='1,10,50', help='comma separated operator counts')
+@click.option('--latency_ms', default=50.0, help='delay added to every rpc round trip')
+@click.option('--queue_length', default=0, help='undelegation queue entries of every operator')
+@click.option('--wallets', default='separate,shared',
+              help='comma separated wallet layouts: a wallet per operator (separate) or one for all (shared)')
+@click.option('--output', default=None, help='json file written with the results, stdout otherwise')
+def main(sponsorships, operators, latency_ms, queue_length, wallets, output):
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault('VAULT_PASSWORD', 'benchmark')
+    results = [run_scenario(sponsorship_count, operator_count, latency_ms / 1000, queue_length,
+                            shared_wallet=wallet_layout == 'shared')
+               for wallet_layout in wallets.split(',')
+               for operator_count in map(int, operators.split(','))
+               for sponsorship_count in map(int, sponsorships.split(','))]
+    document = json.dumps({'results': results}, indent=2)
+    if output:
+        with open(output, 'w') as stream:
+            stream.write(document)
+    else:
+        print(document)
+
+
+if __name__ == '__main__':
+    main()
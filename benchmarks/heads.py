@@ -0,0 +1,139 @@
+"""
+Compare the daemon polling on a timer with the daemon following newHeads, over the same synthetic chain: the base fee
+stays high except for a short cheap window. A WebSocket stand-in emits the heads and moves the stand-in chain of
+benchmarks/harvest.py along. Reports the rpc round trips and requests of each mode and the block the harvest fired at.
+
+    python benchmarks/heads.py --blocks 1000 --window 400 --window_length 20 --poll_blocks 300
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import click
+from web3 import Web3
+from websockets.sync.server import serve
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harvest import StandInChain, start_chain  # noqa: E402
+from daemon import HarvestDaemon  # noqa: E402
+
+GAS_LIMIT = 30000000
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+
+
+class RecordingChain(StandInChain):
+    """Stand-in chain keeping the block and base fee of every claim mined."""
+
+    def __init__(self, earnings: dict):
+        super().__init__(earnings)
+        self.claims = []
+
+    def send_raw_transaction(self, raw: str) -> str:
+        self.claims.append({'block': self.block_number, 'base_fee_gwei': self.base_fee / 10 ** 9})
+        return super().send_raw_transaction(raw)
+
+
+def synthetic_head(number: int, base_fee: int) -> dict:
+    # half full blocks, the next base fee is the same
+    return {'number': hex(number), 'hash': '0x{:064x}'.format(number), 'parentHash': '0x{:064x}'.format(number - 1),
+            'baseFeePerGas': hex(base_fee), 'gasLimit': hex(GAS_LIMIT), 'gasUsed': hex(GAS_LIMIT // 2),
+            'timestamp': hex(1700000000 + 2 * number)}
+
+
+def base_fee_at(number: int, window: int, window_length: int) -> int:
+    return (20 if window <= number < window + window_length else 200) * 10 ** 9
+
+
+def new_chain(sponsorship_count: int) -> RecordingChain:
+    earnings = {OPERATOR: {Web3.to_checksum_address('0x{:040x}'.format(0x5b << 152 | index)): 10 ** 18
+                           for index in range(sponsorship_count)}}
+    return RecordingChain(earnings)
+
+
+def daemon_cfg(chain_url: str, directory: str, **settings) -> dict:
+    return dict({
+        'rpc_url': chain_url,
+        'vault_enabled': False,
+        'wallet_privkey': '0x' + '11' * 32,
+        'operator_contract_adress': OPERATOR,
+        'journal_path': os.path.join(directory, 'journal.sqlite'),
+        'tx_poll_interval': 0.01,
+        'data_price_in_matic': 0.01,
+        'daemon_profit_ratio': 2,
+    }, **settings)
+
+
+def advance(chain: StandInChain, number: int, base_fee: int):
+    with chain._lock:
+        chain.block_number = number
+        chain.base_fee = base_fee
+
+
+def run_polling(blocks: int, window: int, window_length: int, poll_blocks: int, sponsorships: int) -> dict:
+    chain = new_chain(sponsorships)
+    server = start_chain(chain, 0)
+    with tempfile.TemporaryDirectory() as directory:
+        daemon = HarvestDaemon(daemon_cfg('http://127.0.0.1:{}'.format(server.server_address[1]), directory))
+        for number in range(1, blocks + 1):
+            advance(chain, number, base_fee_at(number, window, window_length))
+            if number % poll_blocks == 0:
+                daemon.poll()
+    server.shutdown()
+    return {'mode': 'poll every {} blocks'.format(poll_blocks), 'round_trips': chain.round_trips,
+            'rpc_requests': chain.requests, 'claims': chain.claims}
+
+
+def run_heads(blocks: int, window: int, window_length: int, block_interval: float, sponsorships: int) -> dict:
+    chain = new_chain(sponsorships)
+    server = start_chain(chain, 0)
+    emitted = threading.Event()
+
+    def emit_heads(websocket):
+        request = json.loads(websocket.recv())
+        websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0x1'}))
+        for number in range(1, blocks + 1):
+            base_fee = base_fee_at(number, window, window_length)
+            advance(chain, number, base_fee)
+            websocket.send(json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': {
+                'subscription': '0x1', 'result': synthetic_head(number, base_fee)}}))
+            time.sleep(block_interval)
+        emitted.set()
+
+    with serve(emit_heads, '127.0.0.1', 0) as ws_server, tempfile.TemporaryDirectory() as directory:
+        threading.Thread(target=ws_server.serve_forever, daemon=True).start()
+        ws_url = 'ws://127.0.0.1:{}'.format(ws_server.socket.getsockname()[1])
+        daemon = HarvestDaemon(daemon_cfg('http://127.0.0.1:{}'.format(server.server_address[1]), directory,
+                                          ws_url=ws_url))
+        threading.Thread(target=daemon.follow_heads, args=(ws_url,), daemon=True).start()
+        emitted.wait()
+        while daemon.in_flight:
+            time.sleep(block_interval)
+            daemon.collect_in_flight()
+        ws_server.shutdown()
+    server.shutdown()
+    return {'mode': 'newHeads', 'round_trips': chain.round_trips, 'rpc_requests': chain.requests,
+            'claims': chain.claims}
+
+
+@click.command()
+@click.option('--blocks', default=1000, help='number of synthetic blocks')
+@click.option('--window', default=400, help='first block of the cheap gas window')
+@click.option('--window_length', default=20, help='length of the cheap gas window in blocks')
+@click.option('--poll_blocks', default=300, help='blocks between two polls of the timer mode')
+@click.option('--block_interval', default=0.01, help='seconds between two synthetic heads')
+@click.option('--sponsorships', default=10, help='sponsorships of the operator, 1 DATA each')
+def main(blocks, window, window_length, poll_blocks, block_interval, sponsorships):
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps({'results': [
+        run_polling(blocks, window, window_length, poll_blocks, sponsorships),
+        run_heads(blocks, window, window_length, block_interval, sponsorships),
+    ]}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
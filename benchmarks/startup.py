@@ -0,0 +1,80 @@
+"""
+Time-to-first-RPC of a harvest run: spawn `main.py` against a local JSON-RPC stand-in and measure the time
+between process start and the first request received. Vault is disabled so only the python side is measured.
+
+    python benchmarks/startup.py --runs 10
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FirstRequestHandler(BaseHTTPRequestHandler):
+    first_request_at = None
+
+    def do_POST(self):
+        if FirstRequestHandler.first_request_at is None:
+            FirstRequestHandler.first_request_at = time.perf_counter()
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32000, 'message': 'benchmark'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def time_to_first_rpc(config_path: str) -> float:
+    FirstRequestHandler.first_request_at = None
+    started_at = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--config_path', config_path],
+                               cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while FirstRequestHandler.first_request_at is None and process.poll() is None:
+        time.sleep(0.001)
+    process.kill()
+    process.wait()
+    if FirstRequestHandler.first_request_at is None:
+        raise RuntimeError("main.py exited without sending any rpc request")
+    return FirstRequestHandler.first_request_at - started_at
+
+
+@click.command()
+@click.option('--runs', default=10, help='number of process starts measured')
+def main(runs):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FirstRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = {
+        'rpc_url': 'http://127.0.0.1:{}'.format(server.server_address[1]),
+        'vault_enabled': False,
+        'wallet_privkey': '0x' + '11' * 32,
+        'operator_contract_adress': '0x25F83066055Bc49395ffa782325f1f19C59e1358',
+        'sponsorship_to_claim': ['0x5f0b8a00fe2986fe20b8abe7820953cb31ea7ab5'],
+    }
+    with tempfile.NamedTemporaryFile('w', suffix='.yml') as config_file:
+        yaml.safe_dump(cfg, config_file)
+        config_file.flush()
+        timings = [time_to_first_rpc(config_file.name) for _ in range(runs)]
+    server.shutdown()
+    print(json.dumps({'runs': runs, 'median_s': statistics.median(timings), 'min_s': min(timings),
+                      'max_s': max(timings)}))
+
+
+if __name__ == '__main__':
+    main()
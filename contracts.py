@@ -0,0 +1,26 @@
+import functools
+import json
+import os
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abis')
+
+
+@functools.lru_cache(maxsize=None)
+def load_abi(name: str) -> tuple:
+    """
+    Load abis/<name>.json once per process. The artifacts only hold the entries this project calls,
+    so web3 has a handful of entries to parse instead of the full operator interface.
+    """
+    with open(os.path.join(ABI_DIR, '{}.json'.format(name)), 'r') as stream:
+        return tuple(json.load(stream))
+
+
+_contracts = {}
+
+
+def get_contract(web3, abi_name: str, address: str):
+    """Contract objects are built on first use and reused for the lifetime of the provider."""
+    key = (id(web3), abi_name, address)
+    if key not in _contracts:
+        _contracts[key] = web3.eth.contract(address=address, abi=list(load_abi(abi_name)))
+    return _contracts[key]
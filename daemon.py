@@ -0,0 +1,192 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect
+
+from fees import next_base_fee
+from harvest_sponsorship import (build_web3, load_operators, load_wallet_private_keys, get_operator_contract,
+                                 fetch_harvest_context, select_sponsorships, estimate_claim_cost, harvest_operator,
+                                 log_summary)
+from journal import get_journal, reconcile
+from metrics import serve_metrics
+from vault import VaultError
+
+
+def claim_profit_ratio(cfg: dict, context: dict) -> float:
+    """
+    Value of the claimable earnings divided by the current cost of claiming them. The value is in MATIC
+    when `data_price_in_matic` is set, otherwise the ratio is DATA claimed per MATIC of gas.
+    """
+    selection_cfg = {key: value for key, value in cfg.items() if key != 'data_price_in_matic'}
+    sponsorships = select_sponsorships(selection_cfg, context['earnings'], context['max_allowed_earnings'],
+                                       context['gas_price'])
+    if not sponsorships:
+        return 0
+    claimable = sum(context['earnings'][sponsorship] for sponsorship in sponsorships)
+    claimable_value = claimable * (cfg.get('data_price_in_matic') or 1)
+    return claimable_value / estimate_claim_cost(cfg, len(sponsorships), context['gas_price'])
+
+
+class HarvestDaemon:
+    """
+    Keep provider, contracts and signing keys warm and harvest an operator as soon as its earnings are worth
+    `daemon_profit_ratio` times the claim cost, or when it was not harvested for `daemon_max_interval` seconds.
+
+    With `ws_url` the decision follows newHeads instead of a timer: every `daemon_eval_blocks` blocks the claim cost
+    is re-evaluated at the next block base fee against the earnings cached by the last read, which is refreshed
+    every `daemon_refresh_blocks` blocks. Heads cost no rpc request, earnings are read again before harvesting.
+    """
+
+    def __init__(self, cfg: dict):
+        self.cfg = cfg
+        self.operators = load_operators(cfg)
+        self.wallet_private_keys = load_wallet_private_keys(cfg, self.operators)
+        self.web3 = build_web3(cfg)
+        reconcile(self.web3, get_journal(cfg))
+        self.poll_interval = cfg.get('daemon_poll_interval', 600)
+        self.max_interval = cfg.get('daemon_max_interval', 5 * 24 * 3600)
+        self.profit_ratio = cfg.get('daemon_profit_ratio', 5)
+        self.eval_blocks = cfg.get('daemon_eval_blocks', 1)
+        self.refresh_blocks = cfg.get('daemon_refresh_blocks', 300)
+        self.head_number = None
+        self.contexts = {}
+        self.in_flight = {}
+        started_at = time.monotonic()
+        self.last_harvest = {operator['operator_contract_adress']: started_at for operator in self.operators}
+        self.executor = ThreadPoolExecutor(max_workers=cfg.get('max_workers', min(len(self.operators), 8)))
+
+    def poll_operator(self, operator: dict, wallet_private_key: str):
+        contract_address = operator['operator_contract_adress']
+        if get_journal(operator).pending(contract_address):
+            # a claim of a previous poll or run is still in flight, wait for it before claiming again
+            return harvest_operator(self.web3, operator, wallet_private_key)
+        contract = get_operator_contract(self.web3, contract_address)
+        account = self.web3.eth.account.from_key(wallet_private_key)
+        context = fetch_harvest_context(self.web3, operator, contract, account)
+        self.contexts[contract_address] = (self.head_number, context)
+
+        ratio = claim_profit_ratio(operator, context)
+        overdue = time.monotonic() - self.last_harvest[contract_address] >= self.max_interval
+        logging.info("Operator {}: claim profit ratio {:.2f} (target {}), gas price {} gwei{}".format(
+            contract_address, ratio, self.profit_ratio, context['gas_price'] / 10 ** 9,
+            ", max interval reached" if overdue else ""))
+        if ratio < self.profit_ratio and not overdue:
+            return None
+
+        if overdue:
+            # the safety net claims whatever is above the earnings floor, whatever the gas price
+            operator = {key: value for key, value in operator.items() if key != 'data_price_in_matic'}
+        report = harvest_operator(self.web3, operator, wallet_private_key, context=context)
+        # a skipped report (low balance, nothing worth claiming, nothing scheduled) keeps the safety net armed
+        if report['status'] in ('harvested', 'resumed'):
+            self.last_harvest[contract_address] = time.monotonic()
+        return report
+
+    def refresh_keys(self):
+        try:
+            # served from the vault provider cache until the token or secret lease expires
+            self.wallet_private_keys = load_wallet_private_keys(self.cfg, self.operators)
+        except VaultError as error:
+            logging.error("Could not refresh signing keys from vault, using the previous ones: {}".format(error))
+
+    def poll(self):
+        started_at = time.monotonic()
+        self.refresh_keys()
+        futures = [self.executor.submit(self.poll_operator, operator, wallet_private_key)
+                   for operator, wallet_private_key in zip(self.operators, self.wallet_private_keys)]
+        reports = []
+        for operator, future in zip(self.operators, futures):
+            try:
+                report = future.result()
+            except Exception as error:
+                logging.error("Polling operator {} failed: {}".format(operator['operator_contract_adress'], error))
+                continue
+            if report:
+                reports.append(report)
+        if reports:
+            log_summary(reports, time.monotonic() - started_at, self.web3.provider.stats())
+
+    def collect_in_flight(self):
+        for contract_address, (future, started_at) in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[contract_address]
+            try:
+                report = future.result()
+            except Exception as error:
+                logging.error("Polling operator {} failed: {}".format(contract_address, error))
+                continue
+            if report:
+                log_summary([report], time.monotonic() - started_at, self.web3.provider.stats())
+
+    def on_head(self, head: dict):
+        self.head_number = int(head['number'], 16)
+        self.collect_in_flight()
+        if self.head_number % self.eval_blocks:
+            return
+        base_fee = next_base_fee(head)
+        self.refresh_keys()
+        for operator, wallet_private_key in zip(self.operators, self.wallet_private_keys):
+            contract_address = operator['operator_contract_adress']
+            if contract_address in self.in_flight:
+                continue
+            refreshed_at, context = self.contexts.get(contract_address, (None, None))
+            if context is not None and self.head_number - (refreshed_at or 0) < self.refresh_blocks:
+                context = dict(context, gas_price=base_fee + context['fee_quote']['maxPriorityFeePerGas'])
+                ratio = claim_profit_ratio(operator, context)
+                overdue = time.monotonic() - self.last_harvest[contract_address] >= self.max_interval
+                if ratio < self.profit_ratio and not overdue:
+                    continue
+                logging.info("Block {}: base fee {} gwei, operator {} claim profit ratio {:.2f}".format(
+                    self.head_number, base_fee / 10 ** 9, contract_address, ratio))
+            # earnings are read again by the poll, before any harvest
+            self.in_flight[contract_address] = (
+                self.executor.submit(self.poll_operator, operator, wallet_private_key), time.monotonic())
+
+    def follow_message(self, raw: str):
+        """Evaluate the head of a newHeads notification. Other messages are skipped, errors of one head only logged."""
+        try:
+            message = json.loads(raw)
+            if not isinstance(message, dict) or message.get('method') != 'eth_subscription':
+                logging.debug("Skipping WebSocket message {}".format(raw))
+                return
+            self.on_head(message['params']['result'])
+        except Exception as error:
+            logging.error("Head not evaluated: {}".format(error))
+
+    def follow_heads(self, ws_url: str):
+        head_timeout = self.cfg.get('ws_head_timeout', 60)
+        while True:
+            try:
+                with connect(ws_url) as websocket:
+                    websocket.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe',
+                                               'params': ['newHeads']}))
+                    response = json.loads(websocket.recv(timeout=head_timeout))
+                    if 'error' in response:
+                        raise WebSocketException("newHeads subscription refused: {}".format(response['error']))
+                    logging.info("Following newHeads of {}".format(ws_url))
+                    while True:
+                        self.follow_message(websocket.recv(timeout=head_timeout))
+            except (OSError, WebSocketException) as error:
+                logging.error("WebSocket {} lost, reconnecting: {}".format(ws_url, error))
+                time.sleep(self.cfg.get('ws_reconnect_delay', 5))
+
+    def run(self):
+        if self.cfg.get('metrics_port'):
+            serve_metrics(self.cfg['metrics_port'])
+        if self.cfg.get('ws_url'):
+            logging.info("Harvest daemon started for {} operators, evaluating every {} blocks".format(
+                len(self.operators), self.eval_blocks))
+            self.follow_heads(self.cfg['ws_url'])
+        logging.info("Harvest daemon started for {} operators, polling every {}s".format(
+            len(self.operators), self.poll_interval))
+        while True:
+            self.poll()
+            time.sleep(self.poll_interval)
+
+
+def run_daemon(cfg: dict):
+    HarvestDaemon(cfg).run()
@@ -0,0 +1,118 @@
+import logging
+
+from web3 import Web3
+
+from fees import fee_history_request, parse_fee_history
+from harvest_sponsorship import (build_web3, estimate_claim_cost, get_operator_contract, have_enough_fund,
+                                 load_operators, load_wallet_private_keys, claimable_sponsorships, plan_claims,
+                                 transform_sponsorships_array)
+from readiness import operator_context, operator_requests
+from rpc import eth_call_request, decode_call_result
+from undelegation import WITHDRAW_WITHOUT_QUEUE, is_queue_payout_cheap
+
+
+def simulate_withdraw_request(contract, account, sponsorships: list) -> tuple:
+    """eth_call of withdrawEarningsFromSponsorshipsWithoutQueue from the signing wallet, returns the DATA withdrawn."""
+    _, (call, block) = eth_call_request(contract, WITHDRAW_WITHOUT_QUEUE, sponsorships)
+    return 'eth_call', [dict(call, **{'from': account.address}), block]
+
+
+def decode_withdrawal(contract, result):
+    return None if isinstance(result, ValueError) else decode_call_result(contract, WITHDRAW_WITHOUT_QUEUE, result)[0]
+
+
+def preview_harvest(web3: Web3, cfg: dict, contract, account) -> dict:
+    """
+    The claims a run would send, without sending anything. Fee history, earnings, balance and undelegation queue are
+    read in one batch, the sponsorships are selected and split into claims by the same code as a run (claim gas
+    budget, reverting sponsorships, queue-aware withdraw), then the exact DATA withdrawn by every sponsorship and
+    every claim is simulated in one more batch.
+    """
+    fee_history, chain_id, balance, *results = web3.provider.batch_request([
+        fee_history_request(),
+        ('eth_chainId', []),
+        ('eth_getBalance', [account.address, 'latest']),
+        *operator_requests(contract),
+    ])
+    context = operator_context(cfg, contract, parse_fee_history(fee_history), chain_id, balance, results)
+    wanted = set(transform_sponsorships_array(cfg.get('sponsorship_to_claim') or list(context['earnings'])))
+    sponsorships = [sponsorship for sponsorship, earning in context['earnings'].items()
+                    if earning and sponsorship in wanted]
+    selected = claimable_sponsorships(cfg, contract.address, context)
+    batches, rejected = [], []
+    if selected:
+        batches, rejected = plan_claims(web3, cfg, contract, account, selected, context['queue_length'])
+
+    results = web3.provider.batch_request(
+        [simulate_withdraw_request(contract, account, [sponsorship]) for sponsorship in sponsorships]
+        + [simulate_withdraw_request(contract, account, batch) for batch, _, _ in batches], raise_errors=False)
+    withdrawals = {}
+    for sponsorship, result in zip(sponsorships, results):
+        if isinstance(result, ValueError):
+            logging.warning("Sponsorship {} reverts on withdraw: {}".format(sponsorship, result))
+            continue
+        withdrawals[sponsorship] = decode_withdrawal(contract, result)
+    return dict(context, **{
+        'operator': contract.address,
+        'withdrawals': withdrawals,
+        'selected': selected,
+        'rejected': rejected,
+        'claims': [(batch, gas_estimate, function_name, decode_withdrawal(contract, result))
+                   for (batch, gas_estimate, function_name), result in zip(batches, results[len(sponsorships):])],
+    })
+
+
+def log_preview(cfg: dict, preview: dict, wallet_address: str) -> bool:
+    """Log the projected profit of every sponsorship and claim, and whether the run would send them."""
+    gas_price = preview['gas_price']
+    data_price = cfg.get('data_price_in_matic')
+    sponsorship_cost = estimate_claim_cost(cfg, 1, gas_price) - estimate_claim_cost(cfg, 0, gas_price)
+    logging.info("Operator {}: expected gas price {} gwei, {} undelegations queued".format(
+        preview['operator'], gas_price / 10 ** 9, preview['queue_length']))
+    for sponsorship, withdrawal in preview['withdrawals'].items():
+        profit = "" if data_price is None else ", profit {} MATIC".format(
+            (withdrawal * data_price - sponsorship_cost) / 10 ** 18)
+        logging.info("  {}: withdraws {} DATA for {} MATIC of gas{}{}".format(
+            sponsorship, withdrawal / 10 ** 18, sponsorship_cost / 10 ** 18, profit,
+            "" if sponsorship in preview['selected'] and sponsorship not in preview['rejected']
+            else " (not claimed)"))
+
+    if not preview['selected']:
+        logging.info("  NO GO: no sponsorship worth claiming")
+        return False
+    if not preview['claims']:
+        logging.info("  NO GO: every sponsorship reverts on claim")
+        return False
+    claimed, claim_cost = 0, 0
+    for batch, gas_estimate, function_name, withdrawal in preview['claims']:
+        logging.info("  Claim of {} sponsorships with {} withdraws {} DATA, {} gas for {} MATIC".format(
+            len(batch), function_name, None if withdrawal is None else withdrawal / 10 ** 18, gas_estimate,
+            gas_estimate * gas_price / 10 ** 18))
+        claimed += withdrawal or 0
+        claim_cost += gas_estimate * gas_price
+    if (preview['queue_length'] and all(function_name == WITHDRAW_WITHOUT_QUEUE for _, _, function_name, _
+                                        in preview['claims']) and is_queue_payout_cheap(cfg, gas_price)):
+        logging.info("  The undelegation queue is then paid out on its own transaction")
+    if data_price is not None:
+        logging.info("  Projected profit {} MATIC".format((claimed * data_price - claim_cost) / 10 ** 18))
+    go = have_enough_fund(None, cfg, wallet_address, balance=preview['balance'])
+    logging.info("  {}: {} claim transactions, {} DATA for {} MATIC".format(
+        "GO" if go else "NO GO", len(preview['claims']), claimed / 10 ** 18, claim_cost / 10 ** 18))
+    return go
+
+
+def dry_run(cfg: dict) -> list:
+    operators = load_operators(cfg)
+    wallet_private_keys = load_wallet_private_keys(cfg, operators)
+    web3 = build_web3(cfg)
+    decisions = []
+    for operator, wallet_private_key in zip(operators, wallet_private_keys):
+        try:
+            contract = get_operator_contract(web3, operator['operator_contract_adress'])
+            account = web3.eth.account.from_key(wallet_private_key)
+            decisions.append(log_preview(operator, preview_harvest(web3, operator, contract, account),
+                                         account.address))
+        except Exception as error:
+            logging.error("Dry run of operator {} failed: {}".format(operator['operator_contract_adress'], error))
+            decisions.append(False)
+    return decisions
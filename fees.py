@@ -0,0 +1,100 @@
+import logging
+
+# The 10th percentile tip of a block stands for the lowest tip the block still included
+REWARD_PERCENTILES = [10]
+FEE_HISTORY_BLOCKS = 20
+# EIP-1559 base fee rises at most 12.5% per full block
+MAX_BASE_FEE_CHANGE = 1.125
+BASE_FEE_CHANGE_DENOMINATOR = 8
+
+# Inclusion latency in blocks aimed at by every strategy, reached with INCLUSION_CONFIDENCE
+FEE_STRATEGIES = {
+    'fast': {'target_blocks': 2},
+    'standard': {'target_blocks': 5},
+    'cheap': {'target_blocks': 20},
+}
+INCLUSION_CONFIDENCE = 0.9
+
+
+def fee_history_request(blocks: int = FEE_HISTORY_BLOCKS) -> tuple:
+    return 'eth_feeHistory', [hex(blocks), 'latest', REWARD_PERCENTILES]
+
+
+def parse_fee_history(raw: dict) -> dict:
+    """Convert an eth_feeHistory result to ints. `base_fees` has one more entry than `rewards`: the next block."""
+    return {
+        'oldest_block': int(raw['oldestBlock'], 16),
+        'base_fees': [int(base_fee, 16) for base_fee in raw['baseFeePerGas']],
+        'rewards': [[int(reward, 16) for reward in rewards] for rewards in raw.get('reward') or []],
+    }
+
+
+def tip_quantile(target_blocks: int, confidence: float = INCLUSION_CONFIDENCE) -> float:
+    """
+    Share of blocks a tip must be included by so that one of `target_blocks` blocks includes it with `confidence`,
+    blocks being taken as independent: 1 - (1 - q) ** target_blocks = confidence.
+    """
+    return 1 - (1 - confidence) ** (1 / target_blocks)
+
+
+def base_fee_growth(base_fees: list, target_blocks: int) -> float:
+    """
+    Largest base fee rise over `target_blocks` consecutive blocks of the history, at least one block at the maximum
+    EIP-1559 rate and at most `target_blocks` blocks at this rate.
+    """
+    blocks = max(min(target_blocks, len(base_fees) - 1), 1)
+    growth = max((later / earlier for earlier, later in zip(base_fees, base_fees[blocks:]) if earlier), default=1)
+    return min(max(growth, MAX_BASE_FEE_CHANGE), MAX_BASE_FEE_CHANGE ** target_blocks)
+
+
+def quote_fees(fee_history: dict, strategy: str = 'standard', min_priority_fee: int = 0) -> dict:
+    """
+    EIP-1559 fees for the inclusion latency `target_blocks` of `strategy`. The priority fee is the lowest tip that
+    would have been included by the `tip_quantile` share of the blocks of the history, and maxFeePerGas covers the
+    next base fee growing as fast as it did at worst over `target_blocks` blocks of the history, so the transaction
+    stays includable for its whole target. `expected_gas_price` is what the transaction should actually pay per gas
+    if included next block.
+    """
+    target_blocks = FEE_STRATEGIES[strategy]['target_blocks']
+    lowest_tips = sorted(block_rewards[0] for block_rewards in fee_history['rewards'] if block_rewards)
+    priority_fee = min_priority_fee
+    if lowest_tips:
+        index = min(int(tip_quantile(target_blocks) * len(lowest_tips)), len(lowest_tips) - 1)
+        priority_fee = max(lowest_tips[index], min_priority_fee)
+    next_base_fee = fee_history['base_fees'][-1]
+    max_base_fee = int(next_base_fee * base_fee_growth(fee_history['base_fees'], target_blocks))
+    return {
+        'strategy': strategy,
+        'maxFeePerGas': max_base_fee + priority_fee,
+        'maxPriorityFeePerGas': priority_fee,
+        'expected_gas_price': next_base_fee + priority_fee,
+    }
+
+
+def next_base_fee(head: dict) -> int:
+    """Base fee of the block after `head`, a newHeads or eth_getBlockByNumber result."""
+    base_fee = int(head['baseFeePerGas'], 16)
+    gas_target = int(head['gasLimit'], 16) // 2
+    gas_delta = int(head['gasUsed'], 16) - gas_target
+    change = base_fee * abs(gas_delta) // gas_target // BASE_FEE_CHANGE_DENOMINATOR
+    return base_fee + max(change, 1) if gas_delta > 0 else base_fee - change
+
+
+def operator_fee_quote(cfg: dict, fee_history: dict) -> dict:
+    return quote_fees(fee_history, cfg.get('fee_strategy', 'standard'),
+                      int(cfg.get('min_priority_fee_gwei', 30) * 10 ** 9))
+
+
+def estimate_claim_cost(cfg: dict, sponsorship_count: int, gas_price: int) -> int:
+    """Expected cost in wei of claiming `sponsorship_count` sponsorships in one transaction."""
+    gas = cfg.get('claim_base_gas', 100000) + sponsorship_count * cfg.get('claim_gas_per_sponsorship', 60000)
+    return gas * gas_price
+
+
+def log_fee_accuracy(quote: dict, gas_estimate: int, receipt) -> dict:
+    predicted_cost = gas_estimate * quote['expected_gas_price']
+    actual_cost = receipt['gasUsed'] * receipt['effectiveGasPrice']
+    logging.info("Fee strategy {}: predicted cost {} MATIC, actual cost {} MATIC ({} gas at {} gwei)".format(
+        quote['strategy'], predicted_cost / 10 ** 18, actual_cost / 10 ** 18, receipt['gasUsed'],
+        receipt['effectiveGasPrice'] / 10 ** 9))
+    return {'predicted_cost': predicted_cost, 'actual_cost': actual_cost}
@@ -1,8 +1,25 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from web3 import Web3
+from web3.exceptions import TimeExhausted
 from web3.middleware import geth_poa_middleware
 import logging
 
-from vault import get_privkey_from_vault
+from contracts import get_contract
+from fees import fee_history_request, parse_fee_history, log_fee_accuracy, estimate_claim_cost
+from journal import get_journal, reconcile
+from metrics import WALLET_BALANCE, observe_claim, dump_metrics
+from nonce import get_nonce_manager
+from planner import plan_claim_batches
+from readiness import INSUFFICIENT, check_wallets, log_readiness, operator_context, operator_requests
+from rpc import BatchingHTTPProvider, PooledHTTPProvider
+from scheduler import fit_accrual_rates, plan_harvests
+from tx_manager import TransactionManager
+from undelegation import WITHDRAW, WITHDRAW_WITHOUT_QUEUE, choose_withdraw_functions, send_queue_payout
+from vault import get_vault_provider
 
 
 def transform_sponsorships_array(sponsorships: list) -> list:
@@ -13,455 +30,371 @@ def transform_sponsorships_array(sponsorships: list) -> list:
     return checksum_sponsorship
 
 
-def have_enough_fund(web3: Web3, wallet_address: str) -> bool:
-    if web3.is_connected():
+def have_enough_fund(web3: Web3, cfg: dict, wallet_address: str, balance: int = None) -> bool:
+    """
+    Claims need at least `min_balance_matic` on the signing wallet, a warning is logged under `low_balance_matic`.
+    `balance` in wei is read from the node when not given.
+    """
+    if balance is None:
         balance = web3.eth.get_balance(wallet_address)
     humanized_balance = balance / 10 ** 18
-    if 0.5 < humanized_balance < 1:
-        logging.warning("Balance: {} is enough but you should consider about getting more MATIC on wallet.".format(humanized_balance))
-    elif humanized_balance > 1:
-        logging.info("Enough Balance {} to claim".format(humanized_balance))
-    else:
+    WALLET_BALANCE.labels(wallet_address).set(humanized_balance)
+    if humanized_balance < cfg.get('min_balance_matic', 0.5):
         logging.error("Balance: {} is low, not gonna claim anything".format(humanized_balance))
         return False
+    if humanized_balance < cfg.get('low_balance_matic', 1):
+        logging.warning("Balance: {} is enough but you should consider about getting more MATIC on wallet.".format(humanized_balance))
+    else:
+        logging.info("Enough Balance {} to claim".format(humanized_balance))
     return True
 
 
-def run_harvest_process(web3, cfg: dict, contract, account, wallet_private_key: str):
-    sponsorship_addresses = transform_sponsorships_array(cfg['sponsorship_to_claim'])
-    gas_estimate = contract.functions.withdrawEarningsFromSponsorships(sponsorship_addresses).estimate_gas({
-        'from': account.address,
-    })
-    gas_limit = int(gas_estimate * 1.5)
-    current_gas_price = web3.eth.gas_price
-    gas_price = int(current_gas_price * 1.2)
-    logging.info("gas limit is set to {}, with current_gas_price to {} which will result into {} gas price".format(gas_limit / 10 ** 18, current_gas_price / 10 ** 18, gas_price / 10 ** 18))
-    transaction = contract.functions.withdrawEarningsFromSponsorships(sponsorship_addresses).build_transaction({
-        'from': account.address,
-        'gas': gas_limit,
-        'gasPrice': gas_price,
-        'nonce': web3.eth.get_transaction_count(account.address),
-    })
-    signed_transaction = web3.eth.account.sign_transaction(transaction, wallet_private_key)
-    tx_hash = web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-    gas_used = receipt['gasUsed']
-    logging.info("Transaction Hash: {}, Gas Used: {}".format(tx_hash.hex(), gas_used / 10 ** 18))
-
-
-def collect_earning(cfg: dict):
-    polygon_rpc_url = cfg['rpc_url']
-    if cfg['vault_enabled']:
-        wallet_private_key = get_privkey_from_vault(cfg)
+def fetch_harvest_context(web3: Web3, cfg: dict, contract, account) -> dict:
+    """
+    Every read needed before building the claim sent as one JSON-RPC batch: fee history, chain id, balance,
+    getSponsorshipsAndEarnings, which returns every sponsorship the operator is staked into, their pending
+    earnings in wei and the maxAllowedEarnings above which anyone may trigger the withdraw (and take a cut of it),
+    the undelegation queue indexes and the pending nonce the first time the wallet is used by the nonce manager.
+    `gas_price` is the price per gas expected with the operator fee strategy. With `accrual_scheduler` the earnings
+    are kept in the journal for `accrual_window_days` as samples for the harvest scheduler.
+    """
+    nonce_manager = get_nonce_manager(cfg)
+    calls = [
+        fee_history_request(),
+        ('eth_chainId', []),
+        ('eth_getBalance', [account.address, 'latest']),
+        *operator_requests(contract),
+    ]
+    if not nonce_manager.is_synced(account.address):
+        calls.append(('eth_getTransactionCount', [account.address, 'pending']))
+    fee_history, chain_id, balance, *results = web3.provider.batch_request(calls)
+    if len(results) > 3:
+        nonce_manager.sync(account.address, int(results.pop(), 16))
+    context = operator_context(cfg, contract, parse_fee_history(fee_history), chain_id, balance, results)
+    record_earnings(cfg, contract.address, context)
+    return context
+
+
+def record_earnings(cfg: dict, operator: str, context: dict):
+    """Keep the earnings of a context as samples for the harvest scheduler, with `accrual_scheduler` only."""
+    if cfg.get('accrual_scheduler'):
+        get_journal(cfg).record_earnings(operator, context['earnings'], time.time(),
+                                         cfg.get('accrual_window_days', 7) * 24 * 3600)
+
+
+def select_sponsorships(cfg: dict, earnings: dict, max_allowed_earnings: int, gas_price: int) -> list:
+    """
+    Pick the sponsorships worth claiming, richest first.
+
+    Sponsorships under `min_earning_per_sponsorship` DATA are dropped. When `data_price_in_matic` is set,
+    a sponsorship is only added if its earnings pay `min_profit_ratio` times the gas it adds to the claim,
+    and the run is skipped when the whole claim does not pay for its gas. Sponsorships above
+    maxAllowedEarnings are always claimed since leaving them exposes the earnings to anyone.
+    """
+    if cfg.get('sponsorship_to_claim'):
+        wanted = set(transform_sponsorships_array(cfg['sponsorship_to_claim']))
+        earnings = {address: earning for address, earning in earnings.items() if address in wanted}
+
+    floor = int(cfg.get('min_earning_per_sponsorship', 0) * 10 ** 18)
+    candidates = sorted(((address, earning) for address, earning in earnings.items() if earning > floor),
+                        key=lambda item: item[1], reverse=True)
+
+    data_price = cfg.get('data_price_in_matic')
+    if data_price is None:
+        return [address for address, _ in candidates]
+
+    ratio = cfg.get('min_profit_ratio', 2)
+    sponsorship_cost = estimate_claim_cost(cfg, 1, gas_price) - estimate_claim_cost(cfg, 0, gas_price)
+    selected, claimed_value, forced = [], 0, False
+    for address, earning in candidates:
+        value = earning * data_price
+        if earning > max_allowed_earnings:
+            forced = True
+        elif value < ratio * sponsorship_cost:
+            continue
+        selected.append(address)
+        claimed_value += value
+
+    total_cost = estimate_claim_cost(cfg, len(selected), gas_price)
+    if selected and not forced and claimed_value < ratio * total_cost:
+        logging.info("Claimable {} DATA does not cover {} times the {} MATIC of gas, skipping".format(
+            claimed_value / data_price / 10 ** 18, ratio, total_cost / 10 ** 18))
+        return []
+    return selected
+
+
+def scheduled_sponsorships(cfg: dict, operator: str, context: dict):
+    """
+    Sponsorships due for a claim according to the accrual rates fitted on the earnings samples of `operator`,
+    with the sponsorships whose rate is unknown riding along. None until the samples allow fitting a rate, or when
+    `data_price_in_matic` is not set since the gas of a claim cannot be weighed against the earnings left idle.
+    """
+    if not cfg.get('data_price_in_matic'):
+        logging.warning("accrual_scheduler needs data_price_in_matic, claiming operator {} without schedule".format(
+            operator))
+        return None
+    rates = fit_accrual_rates(get_journal(cfg).earnings_samples(operator))
+    if not rates:
+        return None
+    now = time.time()
+    claims = plan_harvests(cfg, rates, context['earnings'], context['max_allowed_earnings'],
+                           estimate_claim_cost(cfg, 1, context['gas_price']), now)
+    due = [sponsorship for claim in claims if claim['claim_at'] <= now for sponsorship in claim['sponsorships']]
+    upcoming = [claim for claim in claims if claim['claim_at'] > now]
+    if upcoming:
+        logging.info("Next scheduled claim of operator {}: {} sponsorships for about {} DATA in {:.1f} hours".format(
+            operator, len(upcoming[0]['sponsorships']), upcoming[0]['expected_earnings'] / 10 ** 18,
+            (upcoming[0]['claim_at'] - now) / 3600))
+    if not due:
+        return []
+    return due + [sponsorship for sponsorship in context['earnings'] if not rates.get(sponsorship)]
+
+
+def claimable_sponsorships(cfg: dict, operator: str, context: dict) -> list:
+    """Sponsorships the next claim of `operator` holds: the ones due when `accrual_scheduler` is on, then selected."""
+    earnings = context['earnings']
+    if cfg.get('accrual_scheduler'):
+        scheduled = scheduled_sponsorships(cfg, operator, context)
+        if scheduled is not None:
+            earnings = {address: earning for address, earning in earnings.items() if address in scheduled}
+    return select_sponsorships(cfg, earnings, context['max_allowed_earnings'], context['gas_price'])
+
+
+def plan_claims(web3, cfg: dict, contract, account, sponsorships: list, queue_length: int) -> tuple:
+    """
+    Claim transactions for `sponsorships` under `claim_gas_budget`, as (sponsorships, gas estimate, withdraw function),
+    and the sponsorships reverting on their own. With undelegations queued the claims are planned without the queue
+    payout, whose gas is unpredictable, and the default withdraw is kept where it still fits the budget.
+    """
+    batches, rejected = plan_claim_batches(web3, contract, account, sponsorships, cfg.get('claim_gas_budget', 3000000),
+                                           WITHDRAW_WITHOUT_QUEUE if queue_length else WITHDRAW)
+    if batches and queue_length:
+        batches = choose_withdraw_functions(web3, cfg, contract, account, batches, queue_length)
     else:
-        wallet_private_key = cfg['wallet_privkey']
-    contract_address = cfg['operator_contract_adress']
+        batches = [(batch, gas_estimate, WITHDRAW) for batch, gas_estimate in batches]
+    return batches, rejected
+
+
+def run_harvest_process(web3, cfg: dict, contract, account, wallet_private_key: str, context: dict):
+    current_gas_price = context['gas_price']
+    earnings = context['earnings']
+    sponsorship_addresses = claimable_sponsorships(cfg, contract.address, context)
+    if not sponsorship_addresses:
+        logging.info("No sponsorship worth claiming for operator {}".format(contract.address))
+        return None
+    logging.info("Claiming {}/{} sponsorships for {} DATA".format(
+        len(sponsorship_addresses), len(earnings),
+        sum(earnings[address] for address in sponsorship_addresses) / 10 ** 18))
+
+    queue_length = context['queue_length']
+    batches, rejected = plan_claims(web3, cfg, contract, account, sponsorship_addresses, queue_length)
+    if not batches:
+        logging.warning("Every sponsorship of operator {} reverts on claim".format(contract.address))
+        return None
+    fee_quote = context['fee_quote']
+    logging.info("{} claim transactions, {} fees: max fee {} gwei, priority fee {} gwei, expected {} gwei".format(
+        len(batches), fee_quote['strategy'], fee_quote['maxFeePerGas'] / 10 ** 9,
+        fee_quote['maxPriorityFeePerGas'] / 10 ** 9, current_gas_price / 10 ** 9))
+
+    # every batch is sent right away with consecutive nonces, receipts are awaited afterwards. The nonces of a wallet
+    # are allocated and sent by one operator at a time so that they reach the node in order, the wallet is released
+    # before waiting for receipts.
+    block_number = web3.eth.block_number
+    nonce_manager = get_nonce_manager(cfg)
+    transaction_managers = []
+    with wallet_lock(account.address):
+        for batch, gas_estimate, function_name in batches:
+            gas_limit = int(gas_estimate * cfg.get('gas_limit_multiplier', 1.5))
+            nonce = nonce_manager.allocate(account.address, web3)
+            transaction = contract.get_function_by_name(function_name)(batch).build_transaction({
+                'from': account.address,
+                'chainId': context['chain_id'],
+                'gas': gas_limit,
+                'maxFeePerGas': fee_quote['maxFeePerGas'],
+                'maxPriorityFeePerGas': fee_quote['maxPriorityFeePerGas'],
+                'nonce': nonce,
+            })
+            transaction_manager = TransactionManager(web3, cfg, wallet_private_key, journal=get_journal(cfg),
+                                                     sponsorships=batch)
+            try:
+                transaction_manager.submit(transaction, block_number)
+            except ValueError as error:
+                if 'nonce too low' in str(error):
+                    nonce_manager.invalidate(account.address)
+                else:
+                    nonce_manager.release(account.address, nonce)
+                logging.error("Claim of {} sponsorships not sent: {}".format(len(batch), error))
+                break
+            transaction_managers.append((transaction_manager, gas_estimate))
+        if not transaction_managers:
+            raise ValueError("No claim transaction of operator {} could be sent".format(contract.address))
+        if queue_length and all(function_name == WITHDRAW_WITHOUT_QUEUE for _, _, function_name in batches):
+            queue_payout = send_queue_payout(web3, cfg, contract, account, wallet_private_key, context, block_number)
+            if queue_payout:
+                transaction_managers.append(queue_payout)
 
-    web3 = Web3(Web3.HTTPProvider(polygon_rpc_url))
+    result = {'tx_hashes': [], 'gas_used': 0, 'replacements': [], 'rejected_sponsorships': rejected}
+    for transaction_manager, gas_estimate in transaction_managers:
+        try:
+            receipt = transaction_manager.wait()
+        except TimeExhausted as error:
+            logging.error(error)
+            continue
+        tx_hash = receipt['transactionHash']
+        gas_used = receipt['gasUsed']
+        logging.info("Transaction Hash: {}, Gas Used: {}, Cost: {} MATIC".format(
+            tx_hash.hex(), gas_used, gas_used * receipt['effectiveGasPrice'] / 10 ** 18))
+        log_fee_accuracy(fee_quote, gas_estimate, receipt)
+        observe_claim(contract, receipt)
+        result['tx_hashes'].append(tx_hash.hex())
+        result['gas_used'] += gas_used
+        result['replacements'] += transaction_manager.attempts[1:]
+    if not result['tx_hashes']:
+        raise TimeExhausted("No claim transaction of operator {} was mined".format(contract.address))
+    return result
+
+
+def build_web3(cfg: dict) -> Web3:
+    rpc_urls = cfg.get('rpc_urls') or [cfg['rpc_url']]
+    if len(rpc_urls) > 1:
+        provider = PooledHTTPProvider(rpc_urls, hedge_delay=cfg.get('rpc_hedge_delay', 1.0),
+                                      broadcast_count=cfg.get('rpc_broadcast_count', 3))
+    else:
+        provider = BatchingHTTPProvider(rpc_urls[0])
+    web3 = Web3(provider)
     web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    return web3
+
+
+def load_operators(cfg: dict) -> list:
+    """
+    Return one config dict per operator to harvest. Each entry of `operators` inherits the top level
+    settings (vault, rpc, ...) and may override them, e.g. its own `wallet_privkey` or `vault_key`.
+    Configs without `operators` are handled as a single operator for backward compatibility.
+    """
+    operators = cfg.get('operators')
+    if not operators:
+        return [cfg]
+    global_cfg = {key: value for key, value in cfg.items() if key != 'operators'}
+    return [{**global_cfg, **operator} for operator in operators]
+
+
+def load_wallet_private_keys(cfg: dict, operators: list) -> list:
+    """
+    Fetch the signing key of every operator. Vault login and secrets are cached by the vault provider,
+    so this is cheap to call again on every daemon poll.
+    """
+    private_keys = []
+    for operator in operators:
+        if operator['vault_enabled']:
+            private_keys.append(get_vault_provider(cfg).read_secret(operator))
+        else:
+            private_keys.append(operator['wallet_privkey'])
+    return private_keys
+
+
+_wallet_locks = {}
+_wallet_locks_lock = threading.Lock()
+
+
+def wallet_lock(wallet_address: str) -> threading.Lock:
+    """Operators sharing a signing wallet send their claims one at a time, so their nonces reach the node in order."""
+    with _wallet_locks_lock:
+        return _wallet_locks.setdefault(wallet_address, threading.Lock())
+
+
+def get_operator_contract(web3: Web3, contract_address: str):
+    return get_contract(web3, 'operator', contract_address)
+
+
+def resume_in_flight_claims(web3: Web3, cfg: dict, wallet_private_key: str, in_flight: list) -> dict:
+    """Wait for the journaled claims of a previous run instead of sending a new one, nonce by nonce."""
+    result = {'tx_hashes': [], 'gas_used': 0, 'replacements': []}
+    for nonce in sorted({row['nonce'] for row in in_flight}):
+        rows = [row for row in in_flight if row['nonce'] == nonce]
+        logging.info("Resuming in-flight claim {} of operator {}".format(rows[-1]['tx_hash'], rows[-1]['operator']))
+        transaction_manager = TransactionManager(web3, cfg, wallet_private_key, journal=get_journal(cfg),
+                                                 sponsorships=json.loads(rows[-1]['sponsorships']))
+        receipt = transaction_manager.resume(rows)
+        observe_claim(get_operator_contract(web3, cfg['operator_contract_adress']), receipt)
+        result['tx_hashes'].append(receipt['transactionHash'].hex())
+        result['gas_used'] += receipt['gasUsed']
+        result['replacements'] += transaction_manager.attempts[len(rows):]
+    return result
+
+
+def harvest_operator(web3: Web3, cfg: dict, wallet_private_key: str, context: dict = None) -> dict:
+    contract_address = cfg['operator_contract_adress']
+    report = {'operator': contract_address, 'status': 'skipped', 'tx_hashes': [], 'gas_used': None}
+    try:
+        contract = get_operator_contract(web3, contract_address)
+        account = web3.eth.account.from_key(wallet_private_key)
+
+        with wallet_lock(account.address):
+            in_flight = [row for row in get_journal(cfg).pending(contract_address) if row['wallet'] == account.address]
+        if in_flight:
+            report.update(resume_in_flight_claims(web3, cfg, wallet_private_key, in_flight))
+            report['status'] = 'resumed'
+            return report
+        if context is None:
+            context = fetch_harvest_context(web3, cfg, contract, account)
+        if have_enough_fund(web3, cfg, account.address, balance=context['balance']):
+            result = run_harvest_process(web3=web3, cfg=cfg, contract=contract, account=account,
+                                         wallet_private_key=wallet_private_key, context=context)
+            if result:
+                report.update(result)
+                report['status'] = 'harvested'
+    except Exception as error:
+        logging.error("Harvest of operator {} failed: {}".format(contract_address, error))
+        report['status'] = 'failed'
+    return report
+
+
+def log_summary(reports: list, elapsed: float, rpc_stats: dict):
+    harvested = [report for report in reports if report['status'] in ('harvested', 'resumed')]
+    logging.info("Harvest summary: {}/{} operators harvested in {:.1f}s, {} rpc requests in {} round trips".format(
+        len(harvested), len(reports), elapsed, rpc_stats['requests'], rpc_stats['round_trips']))
+    for report in reports:
+        logging.info("  {} -> {} (tx: {}, gas used: {}, replacements: {}, rejected sponsorships: {})".format(
+            report['operator'], report['status'], ', '.join(report['tx_hashes']) or None, report['gas_used'],
+            len(report.get('replacements', [])), report.get('rejected_sponsorships') or None))
+
+
+def collect_earning(cfg: dict) -> list:
+    started_at = time.monotonic()
+    operators = load_operators(cfg)
+    wallet_private_keys = load_wallet_private_keys(cfg, operators)
+    web3 = build_web3(cfg)
+    reconcile(web3, get_journal(cfg))
+
+    # every wallet is checked in one batch, whose pending nonces also sync the nonce manager
+    wallet_addresses = [web3.eth.account.from_key(key).address for key in wallet_private_keys]
+    readiness = check_wallets(web3, operators, wallet_addresses)
+    log_readiness(readiness)
+    nonce_manager = get_nonce_manager(cfg)
+    for wallet in readiness:
+        if wallet['nonce'] is not None:
+            nonce_manager.sync(wallet['wallet'], wallet['nonce'])
+    unfunded = {wallet['wallet'] for wallet in readiness if wallet['status'] == INSUFFICIENT}
+    # the same batch read the claim context of every operator, those whose reads failed are not harvested
+    contexts = {operator: context for wallet in readiness for operator, context in wallet['contexts'].items()}
+    unread = {operator for wallet in readiness for operator in wallet['failed_operators']}
+
+    def harvest(operator: dict, wallet_private_key: str, wallet_address: str) -> dict:
+        contract_address = operator['operator_contract_adress']
+        if wallet_address in unfunded or contract_address in unread:
+            return {'operator': contract_address, 'status': 'failed' if contract_address in unread else 'skipped',
+                    'tx_hashes': [], 'gas_used': None}
+        context = contexts.get(contract_address)
+        if context is not None:
+            record_earnings(operator, contract_address, context)
+        return harvest_operator(web3, operator, wallet_private_key, context=context)
+
+    max_workers = cfg.get('max_workers', min(len(operators), 8))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        reports = list(executor.map(harvest, operators, wallet_private_keys, wallet_addresses))
 
-    contract_abi = [{"inputs": [], "stateMutability": "nonpayable", "type": "constructor"},
-                    {"inputs": [], "name": "AccessDenied", "type": "error"},
-                    {"inputs": [], "name": "AccessDeniedDATATokenOnly", "type": "error"},
-                    {"inputs": [], "name": "AccessDeniedNodesOnly", "type": "error"},
-                    {"inputs": [], "name": "AccessDeniedOperatorOnly", "type": "error"},
-                    {"inputs": [], "name": "AccessDeniedStreamrSponsorshipOnly", "type": "error"}, {
-                        "inputs": [{"internalType": "uint256", "name": "operatorTokenBalanceWei", "type": "uint256"},
-                                   {"internalType": "uint256", "name": "minimumDelegationWei", "type": "uint256"}],
-                        "name": "DelegationBelowMinimum", "type": "error"},
-                    {"inputs": [], "name": "DidNotReceiveReward", "type": "error"},
-                    {"inputs": [], "name": "FirstEmptyQueueThenStake", "type": "error"},
-                    {"inputs": [{"internalType": "uint256", "name": "newOperatorsCutFraction", "type": "uint256"}],
-                     "name": "InvalidOperatorsCut", "type": "error"}, {
-                        "inputs": [{"internalType": "address", "name": "module", "type": "address"},
-                                   {"internalType": "bytes", "name": "data", "type": "bytes"}], "name": "ModuleCallError",
-                        "type": "error"},
-                    {"inputs": [{"internalType": "bytes", "name": "data", "type": "bytes"}], "name": "ModuleGetError",
-                     "type": "error"}, {"inputs": [], "name": "NoEarnings", "type": "error"},
-                    {"inputs": [], "name": "NotMyStakedSponsorship", "type": "error"}, {
-                        "inputs": [{"internalType": "uint256", "name": "operatorBalanceWei", "type": "uint256"},
-                                   {"internalType": "uint256", "name": "minimumSelfDelegationWei", "type": "uint256"}],
-                        "name": "SelfDelegationTooLow", "type": "error"},
-                    {"inputs": [], "name": "StakedInSponsorships", "type": "error"},
-                    {"inputs": [], "name": "ZeroUndelegation", "type": "error"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "address", "name": "owner", "type": "address"},
-            {"indexed": True, "internalType": "address", "name": "spender", "type": "address"},
-            {"indexed": False, "internalType": "uint256", "name": "value", "type": "uint256"}], "name": "Approval",
-                                                                                  "type": "event"}, {"anonymous": False,
-                                                                                                     "inputs": [
-                                                                                                         {"indexed": True,
-                                                                                                          "internalType": "address",
-                                                                                                          "name": "delegator",
-                                                                                                          "type": "address"},
-                                                                                                         {"indexed": False,
-                                                                                                          "internalType": "uint256",
-                                                                                                          "name": "balanceWei",
-                                                                                                          "type": "uint256"},
-                                                                                                         {"indexed": False,
-                                                                                                          "internalType": "uint256",
-                                                                                                          "name": "totalSupplyWei",
-                                                                                                          "type": "uint256"},
-                                                                                                         {"indexed": False,
-                                                                                                          "internalType": "uint256",
-                                                                                                          "name": "dataValueWithoutEarnings",
-                                                                                                          "type": "uint256"}],
-                                                                                                     "name": "BalanceUpdate",
-                                                                                                     "type": "event"},
-                    {"anonymous": False,
-                     "inputs": [{"indexed": True, "internalType": "address", "name": "delegator", "type": "address"},
-                                {"indexed": False, "internalType": "uint256", "name": "amountDataWei", "type": "uint256"}],
-                     "name": "Delegated", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "address", "name": "nodeAddress", "type": "address"},
-            {"indexed": False, "internalType": "string", "name": "jsonData", "type": "string"}], "name": "Heartbeat",
-                                                             "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": False, "internalType": "uint8", "name": "version", "type": "uint8"}], "name": "Initialized",
-                                                                                "type": "event"}, {"anonymous": False,
-                                                                                                   "inputs": [
-                                                                                                       {"indexed": False,
-                                                                                                        "internalType": "uint256",
-                                                                                                        "name": "valueDecreaseWei",
-                                                                                                        "type": "uint256"}],
-                                                                                                   "name": "Loss",
-                                                                                                   "type": "event"},
-                    {"anonymous": False, "inputs": [
-                        {"indexed": False, "internalType": "string", "name": "metadataJsonString", "type": "string"},
-                        {"indexed": True, "internalType": "address", "name": "operatorAddress", "type": "address"},
-                        {"indexed": True, "internalType": "uint256", "name": "operatorsCutFraction", "type": "uint256"}],
-                     "name": "MetadataUpdated", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": False, "internalType": "address[]", "name": "nodes", "type": "address[]"}], "name": "NodesSet",
-                                                                   "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": False, "internalType": "uint256", "name": "slashingAmountDataWei", "type": "uint256"},
-            {"indexed": False, "internalType": "uint256", "name": "slashingAmountInOperatorTokensWei", "type": "uint256"},
-            {"indexed": False, "internalType": "uint256", "name": "actuallySlashedInOperatorTokensWei", "type": "uint256"}],
-                                                                                      "name": "OperatorSlashed",
-                                                                                      "type": "event"}, {"anonymous": False,
-                                                                                                         "inputs": [{
-                                                                                                                        "indexed": False,
-                                                                                                                        "internalType": "uint256",
-                                                                                                                        "name": "totalStakeInSponsorshipsWei",
-                                                                                                                        "type": "uint256"},
-                                                                                                                    {
-                                                                                                                        "indexed": False,
-                                                                                                                        "internalType": "uint256",
-                                                                                                                        "name": "dataTokenBalanceWei",
-                                                                                                                        "type": "uint256"}],
-                                                                                                         "name": "OperatorValueUpdate",
-                                                                                                         "type": "event"},
-                    {"anonymous": False, "inputs": [
-                        {"indexed": False, "internalType": "uint256", "name": "valueIncreaseWei", "type": "uint256"},
-                        {"indexed": True, "internalType": "uint256", "name": "operatorsCutDataWei", "type": "uint256"},
-                        {"indexed": True, "internalType": "uint256", "name": "protocolFeeDataWei", "type": "uint256"}],
-                     "name": "Profit", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "address", "name": "delegator", "type": "address"},
-            {"indexed": False, "internalType": "uint256", "name": "amountWei", "type": "uint256"},
-            {"indexed": False, "internalType": "uint256", "name": "queueIndex", "type": "uint256"}], "name": "QueueUpdated",
-                                                          "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "address", "name": "delegator", "type": "address"},
-            {"indexed": False, "internalType": "uint256", "name": "amountWei", "type": "uint256"},
-            {"indexed": False, "internalType": "uint256", "name": "queueIndex", "type": "uint256"}],
-                                                                             "name": "QueuedDataPayout", "type": "event"},
-                    {"anonymous": False, "inputs": [
-                        {"indexed": True, "internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                        {"indexed": True, "internalType": "address", "name": "targetOperator", "type": "address"},
-                        {"indexed": False, "internalType": "uint256", "name": "voteStartTimestamp", "type": "uint256"},
-                        {"indexed": False, "internalType": "uint256", "name": "voteEndTimestamp", "type": "uint256"},
-                        {"indexed": False, "internalType": "string", "name": "flagMetadata", "type": "string"}],
-                     "name": "ReviewRequest", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "bytes32", "name": "role", "type": "bytes32"},
-            {"indexed": True, "internalType": "bytes32", "name": "previousAdminRole", "type": "bytes32"},
-            {"indexed": True, "internalType": "bytes32", "name": "newAdminRole", "type": "bytes32"}],
-                                                                 "name": "RoleAdminChanged", "type": "event"},
-                    {"anonymous": False,
-                     "inputs": [{"indexed": True, "internalType": "bytes32", "name": "role", "type": "bytes32"},
-                                {"indexed": True, "internalType": "address", "name": "account", "type": "address"},
-                                {"indexed": True, "internalType": "address", "name": "sender", "type": "address"}],
-                     "name": "RoleGranted", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "bytes32", "name": "role", "type": "bytes32"},
-            {"indexed": True, "internalType": "address", "name": "account", "type": "address"},
-            {"indexed": True, "internalType": "address", "name": "sender", "type": "address"}], "name": "RoleRevoked",
-                                                               "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-            {"indexed": False, "internalType": "uint256", "name": "stakedWei", "type": "uint256"}], "name": "StakeUpdate",
-                                                                                  "type": "event"}, {"anonymous": False,
-                                                                                                     "inputs": [
-                                                                                                         {"indexed": True,
-                                                                                                          "internalType": "contract Sponsorship",
-                                                                                                          "name": "sponsorship",
-                                                                                                          "type": "address"}],
-                                                                                                     "name": "Staked",
-                                                                                                     "type": "event"},
-                    {"anonymous": False,
-                     "inputs": [{"indexed": True, "internalType": "address", "name": "from", "type": "address"},
-                                {"indexed": True, "internalType": "address", "name": "to", "type": "address"},
-                                {"indexed": False, "internalType": "uint256", "name": "value", "type": "uint256"}],
-                     "name": "Transfer", "type": "event"}, {"anonymous": False, "inputs": [
-            {"indexed": True, "internalType": "address", "name": "delegator", "type": "address"},
-            {"indexed": False, "internalType": "uint256", "name": "amountDataWei", "type": "uint256"}],
-                                                            "name": "Undelegated", "type": "event"}, {"anonymous": False,
-                                                                                                      "inputs": [
-                                                                                                          {"indexed": True,
-                                                                                                           "internalType": "contract Sponsorship",
-                                                                                                           "name": "sponsorship",
-                                                                                                           "type": "address"}],
-                                                                                                      "name": "Unstaked",
-                                                                                                      "type": "event"},
-                    {"stateMutability": "nonpayable", "type": "fallback"}, {"inputs": [], "name": "CONTROLLER_ROLE",
-                                                                            "outputs": [
-                                                                                {"internalType": "bytes32", "name": "",
-                                                                                 "type": "bytes32"}],
-                                                                            "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "DEFAULT_ADMIN_ROLE",
-                     "outputs": [{"internalType": "bytes32", "name": "", "type": "bytes32"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [], "name": "OWNER_ROLE",
-                                           "outputs": [{"internalType": "bytes32", "name": "", "type": "bytes32"}],
-                                           "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "owner", "type": "address"},
-                                   {"internalType": "address", "name": "spender", "type": "address"}], "name": "allowance",
-                        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                        "type": "function"}, {"inputs": [{"internalType": "address", "name": "spender", "type": "address"},
-                                                         {"internalType": "uint256", "name": "amount", "type": "uint256"}],
-                                              "name": "approve",
-                                              "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                                              "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "address", "name": "delegator", "type": "address"}],
-                     "name": "balanceInData",
-                     "outputs": [{"internalType": "uint256", "name": "amountDataWei", "type": "uint256"}],
-                     "stateMutability": "view", "type": "function"},
-                    {"inputs": [{"internalType": "address", "name": "account", "type": "address"}], "name": "balanceOf",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"},
-                    {"inputs": [], "name": "decimals", "outputs": [{"internalType": "uint8", "name": "", "type": "uint8"}],
-                     "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "spender", "type": "address"},
-                                   {"internalType": "uint256", "name": "subtractedValue", "type": "uint256"}],
-                        "name": "decreaseAllowance", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                        "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "amountWei", "type": "uint256"}], "name": "delegate",
-                     "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "delegationPolicy",
-                     "outputs": [{"internalType": "contract IDelegationPolicy", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "exchangeRatePolicy",
-                                                                      "outputs": [
-                                                                          {"internalType": "contract IExchangeRatePolicy",
-                                                                           "name": "", "type": "address"}],
-                                                                      "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "address", "name": "targetOperator", "type": "address"},
-                                   {"internalType": "string", "name": "flagMetadata", "type": "string"}], "name": "flag",
-                        "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "uint256", "name": "maxQueuePayoutIterations", "type": "uint256"}],
-                        "name": "forceUnstake", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "getNodeAddresses",
-                     "outputs": [{"internalType": "address[]", "name": "", "type": "address[]"}], "stateMutability": "view",
-                     "type": "function"},
-                    {"inputs": [{"internalType": "bytes32", "name": "role", "type": "bytes32"}], "name": "getRoleAdmin",
-                     "outputs": [{"internalType": "bytes32", "name": "", "type": "bytes32"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [], "name": "getSponsorshipsAndEarnings", "outputs": [
-            {"internalType": "address[]", "name": "addresses", "type": "address[]"},
-            {"internalType": "uint256[]", "name": "earnings", "type": "uint256[]"},
-            {"internalType": "uint256", "name": "maxAllowedEarnings", "type": "uint256"}], "stateMutability": "view",
-                                           "type": "function"}, {"inputs": [], "name": "getStreamMetadata", "outputs": [
-            {"internalType": "string", "name": "", "type": "string"}], "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "bytes32", "name": "role", "type": "bytes32"},
-                                   {"internalType": "address", "name": "account", "type": "address"}], "name": "grantRole",
-                        "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "bytes32", "name": "role", "type": "bytes32"},
-                                   {"internalType": "address", "name": "account", "type": "address"}], "name": "hasRole",
-                        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}], "stateMutability": "view",
-                        "type": "function"},
-                    {"inputs": [{"internalType": "string", "name": "jsonData", "type": "string"}], "name": "heartbeat",
-                     "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "spender", "type": "address"},
-                                   {"internalType": "uint256", "name": "addedValue", "type": "uint256"}],
-                        "name": "increaseAllowance", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                        "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "contract Sponsorship", "name": "", "type": "address"}],
-                     "name": "indexOfSponsorships", "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                     "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "tokenAddress", "type": "address"},
-                                   {"internalType": "contract StreamrConfig", "name": "config", "type": "address"},
-                                   {"internalType": "address", "name": "ownerAddress", "type": "address"},
-                                   {"internalType": "string", "name": "operatorTokenName", "type": "string"},
-                                   {"internalType": "string", "name": "operatorMetadataJson", "type": "string"},
-                                   {"internalType": "uint256", "name": "operatorsCut", "type": "uint256"},
-                                   {"internalType": "address[3]", "name": "modules", "type": "address[3]"}],
-                        "name": "initialize", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "address", "name": "forwarder", "type": "address"}],
-                     "name": "isTrustedForwarder", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "metadata", "outputs": [
-            {"internalType": "string", "name": "", "type": "string"}], "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "name", "outputs": [{"internalType": "string", "name": "", "type": "string"}],
-                     "stateMutability": "view", "type": "function"},
-                    {"inputs": [{"internalType": "address", "name": "", "type": "address"}], "name": "nodeIndex",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [], "name": "nodeModule", "outputs": [
-            {"internalType": "contract INodeModule", "name": "", "type": "address"}], "stateMutability": "view",
-                                           "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "name": "nodes",
-                     "outputs": [{"internalType": "address", "name": "", "type": "address"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [{"internalType": "uint256", "name": "", "type": "uint256"},
-                                                      {"internalType": "uint256", "name": "receivedPayoutWei",
-                                                       "type": "uint256"}], "name": "onKick", "outputs": [],
-                                           "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "address", "name": "targetOperator", "type": "address"}],
-                     "name": "onReviewRequest", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "amountSlashed", "type": "uint256"}], "name": "onSlash",
-                     "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "sender", "type": "address"},
-                                   {"internalType": "uint256", "name": "amount", "type": "uint256"},
-                                   {"internalType": "bytes", "name": "data", "type": "bytes"}], "name": "onTokenTransfer",
-                        "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "operatorsCutFraction",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"},
-                    {"inputs": [], "name": "owner", "outputs": [{"internalType": "address", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "payOutFirstInQueue",
-                                                                      "outputs": [
-                                                                          {"internalType": "bool", "name": "payoutComplete",
-                                                                           "type": "bool"}],
-                                                                      "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "maxIterations", "type": "uint256"}],
-                     "name": "payOutQueue", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "queueCurrentIndex",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "name": "queueEntryAt",
-                     "outputs": [{"internalType": "address", "name": "delegator", "type": "address"},
-                                 {"internalType": "uint256", "name": "amountWei", "type": "uint256"},
-                                 {"internalType": "uint256", "name": "timestamp", "type": "uint256"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "queueIsEmpty", "outputs": [
-            {"internalType": "bool", "name": "", "type": "bool"}], "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "queueLastIndex",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [], "name": "queueModule", "outputs": [
-            {"internalType": "contract IQueueModule", "name": "", "type": "address"}], "stateMutability": "view",
-                                           "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "uint256", "name": "targetStakeWei", "type": "uint256"}],
-                        "name": "reduceStakeTo", "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "uint256", "name": "targetStakeWei", "type": "uint256"}],
-                        "name": "reduceStakeWithoutQueue", "outputs": [], "stateMutability": "nonpayable",
-                        "type": "function"}, {"inputs": [{"internalType": "bytes32", "name": "role", "type": "bytes32"},
-                                                         {"internalType": "address", "name": "account", "type": "address"}],
-                                              "name": "renounceRole", "outputs": [], "stateMutability": "nonpayable",
-                                              "type": "function"}, {
-                        "inputs": [{"internalType": "bytes32", "name": "role", "type": "bytes32"},
-                                   {"internalType": "address", "name": "account", "type": "address"}], "name": "revokeRole",
-                        "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract IDelegationPolicy", "name": "policy", "type": "address"},
-                                   {"internalType": "uint256", "name": "param", "type": "uint256"}],
-                        "name": "setDelegationPolicy", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "contract IExchangeRatePolicy", "name": "policy", "type": "address"},
-                                {"internalType": "uint256", "name": "param", "type": "uint256"}],
-                     "name": "setExchangeRatePolicy", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "address[]", "name": "newNodes", "type": "address[]"}],
-                     "name": "setNodeAddresses", "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract IUndelegationPolicy", "name": "policy", "type": "address"},
-                                   {"internalType": "uint256", "name": "param", "type": "uint256"}],
-                        "name": "setUndelegationPolicy", "outputs": [], "stateMutability": "nonpayable",
-                        "type": "function"},
-                    {"inputs": [{"internalType": "contract Sponsorship", "name": "", "type": "address"}],
-                     "name": "slashedIn", "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                     "stateMutability": "view", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "name": "sponsorships",
-                     "outputs": [{"internalType": "contract Sponsorship", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "uint256", "name": "amountWei", "type": "uint256"}], "name": "stake",
-                        "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "stakeModule",
-                     "outputs": [{"internalType": "contract IStakeModule", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"},
-                    {"inputs": [{"internalType": "contract Sponsorship", "name": "", "type": "address"}],
-                     "name": "stakedInto", "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "streamId", "outputs": [
-            {"internalType": "string", "name": "", "type": "string"}], "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "streamRegistry",
-                     "outputs": [{"internalType": "contract IStreamRegistryV4", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "streamrConfig", "outputs": [
-            {"internalType": "contract StreamrConfig", "name": "", "type": "address"}], "stateMutability": "view",
-                                                                      "type": "function"},
-                    {"inputs": [{"internalType": "bytes4", "name": "interfaceId", "type": "bytes4"}],
-                     "name": "supportsInterface", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                     "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "symbol", "outputs": [{"internalType": "string", "name": "", "type": "string"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "token", "outputs": [
-            {"internalType": "contract IERC677", "name": "", "type": "address"}], "stateMutability": "view",
-                                                                      "type": "function"},
-                    {"inputs": [], "name": "totalSlashedInSponsorshipsWei",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [], "name": "totalStakedIntoSponsorshipsWei",
-                                           "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                                           "stateMutability": "view", "type": "function"},
-                    {"inputs": [], "name": "totalSupply",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"}, {"inputs": [{"internalType": "address", "name": "to", "type": "address"},
-                                                      {"internalType": "uint256", "name": "amount", "type": "uint256"}],
-                                           "name": "transfer",
-                                           "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                                           "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "address", "name": "from", "type": "address"},
-                                   {"internalType": "address", "name": "to", "type": "address"},
-                                   {"internalType": "uint256", "name": "amount", "type": "uint256"}],
-                        "name": "transferFrom", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-                        "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Operator", "name": "other", "type": "address"},
-                                   {"internalType": "contract Sponsorship[]", "name": "sponsorshipAddresses",
-                                    "type": "address[]"}], "name": "triggerAnotherOperatorWithdraw", "outputs": [],
-                        "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "amountDataWei", "type": "uint256"}],
-                     "name": "undelegate", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "undelegationPolicy",
-                     "outputs": [{"internalType": "contract IUndelegationPolicy", "name": "", "type": "address"}],
-                     "stateMutability": "view", "type": "function"}, {"inputs": [], "name": "undelegationQueue",
-                                                                      "outputs": [{"components": [
-                                                                          {"internalType": "address", "name": "delegator",
-                                                                           "type": "address"},
-                                                                          {"internalType": "uint256", "name": "amountWei",
-                                                                           "type": "uint256"},
-                                                                          {"internalType": "uint256", "name": "timestamp",
-                                                                           "type": "uint256"}],
-                                                                                   "internalType": "struct Operator.UndelegationQueueEntry[]",
-                                                                                   "name": "queue", "type": "tuple[]"}],
-                                                                      "stateMutability": "view", "type": "function"},
-                    {"inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"}],
-                     "name": "unstake", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"}],
-                     "name": "unstakeWithoutQueue", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "string", "name": "metadataJsonString", "type": "string"}],
-                     "name": "updateMetadata", "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "address[]", "name": "addNodes", "type": "address[]"},
-                                   {"internalType": "address[]", "name": "removeNodes", "type": "address[]"}],
-                        "name": "updateNodeAddresses", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [{"internalType": "uint256", "name": "newOperatorsCutFraction", "type": "uint256"}],
-                     "name": "updateOperatorsCutFraction", "outputs": [], "stateMutability": "nonpayable",
-                     "type": "function"},
-                    {"inputs": [{"internalType": "string", "name": "metadataJsonString", "type": "string"}],
-                     "name": "updateStreamMetadata", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
-                    {"inputs": [], "name": "valueWithoutEarnings",
-                     "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}], "stateMutability": "view",
-                     "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship", "name": "sponsorship", "type": "address"},
-                                   {"internalType": "address", "name": "targetOperator", "type": "address"},
-                                   {"internalType": "bytes32", "name": "voteData", "type": "bytes32"}],
-                        "name": "voteOnFlag", "outputs": [], "stateMutability": "nonpayable", "type": "function"}, {
-                        "inputs": [{"internalType": "contract Sponsorship[]", "name": "sponsorshipAddresses",
-                                    "type": "address[]"}], "name": "withdrawEarningsFromSponsorships", "outputs": [],
-                        "stateMutability": "nonpayable", "type": "function"}, {"inputs": [
-            {"internalType": "contract Sponsorship[]", "name": "sponsorshipAddresses", "type": "address[]"}],
-                                                                               "name": "withdrawEarningsFromSponsorshipsWithoutQueue",
-                                                                               "outputs": [{"internalType": "uint256",
-                                                                                            "name": "withdrawnEarningsDataWei",
-                                                                                            "type": "uint256"}],
-                                                                               "stateMutability": "nonpayable",
-                                                                               "type": "function"}]
-
-    contract = web3.eth.contract(address=contract_address, abi=contract_abi)
-    account = web3.eth.account.from_key(wallet_private_key)
-    web3.eth.defaultAccount = account.address
-
-    if have_enough_fund(web3, account.address):
-        run_harvest_process(web3=web3, cfg=cfg, contract=contract,
-                            account=account, wallet_private_key=wallet_private_key)
+    log_summary(reports, time.monotonic() - started_at, web3.provider.stats())
+    if cfg.get('metrics_textfile'):
+        dump_metrics(cfg['metrics_textfile'])
+    return reports
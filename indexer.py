@@ -0,0 +1,237 @@
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+from harvest_sponsorship import build_web3, get_operator_contract, load_operators
+
+INDEXED_EVENTS = ('Profit', 'Loss', 'OperatorValueUpdate', 'StakeUpdate')
+# a range returning fewer logs than this is sparse, the next ranges are twice as large
+SPARSE_LOGS = 100
+# eth_getLogs refusals for the size of the range or of its result, as worded by geth, Infura, Alchemy, Ankr, ...
+RANGE_TOO_LARGE_ERRORS = ('block range', 'range is too', 'too large', 'too wide', 'returned more than',
+                          'response size', 'query timeout', 'limited to a')
+RATE_LIMIT_ERRORS = ('too many requests', 'rate limit', 'rate-limit', 'request rate')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    transaction_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL,
+    operator TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value_wei TEXT,
+    operators_cut_wei TEXT,
+    protocol_fee_wei TEXT,
+    total_stake_wei TEXT,
+    data_balance_wei TEXT,
+    sponsorship TEXT,
+    staked_wei TEXT,
+    PRIMARY KEY (transaction_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS events_operator ON events (operator, name, block_number);
+CREATE TABLE IF NOT EXISTS blocks (
+    block_number INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    operator TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class EventIndex:
+    """
+    Local SQLite copy of the Profit, Loss, OperatorValueUpdate and StakeUpdate events of every operator, with the
+    last block indexed per operator. Amounts are stored as decimal strings since they overflow SQLite integers.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def checkpoint(self, operator: str):
+        with self._lock:
+            row = self.connection.execute("SELECT block_number FROM checkpoints WHERE operator = ?",
+                                          (operator,)).fetchone()
+        return row['block_number'] if row else None
+
+    def store(self, operator: str, to_block: int, events: list, timestamps: dict):
+        """Store the events of a range and move the checkpoint of `operator` to `to_block`, atomically."""
+        with self._lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+            self.connection.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?)", timestamps.items())
+            self.connection.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                                    (operator, to_block, time.time()))
+            self.connection.execute("COMMIT")
+
+    def profit_by_period(self, operator: str, period: str = '%Y-%m') -> list:
+        """Profit, operator's cut, protocol fee and loss of `operator` in DATA, per strftime `period`."""
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(
+                "SELECT strftime(?, blocks.timestamp, 'unixepoch') AS period, "
+                "SUM(CASE WHEN name = 'Profit' THEN CAST(value_wei AS REAL) ELSE 0 END) / 1e18 AS profit, "
+                "SUM(CASE WHEN name = 'Profit' THEN CAST(operators_cut_wei AS REAL) ELSE 0 END) / 1e18 "
+                "AS operators_cut, "
+                "SUM(CASE WHEN name = 'Profit' THEN CAST(protocol_fee_wei AS REAL) ELSE 0 END) / 1e18 "
+                "AS protocol_fee, "
+                "SUM(CASE WHEN name = 'Loss' THEN CAST(value_wei AS REAL) ELSE 0 END) / 1e18 AS loss, "
+                "SUM(name = 'Profit') AS withdrawals "
+                "FROM events JOIN blocks USING (block_number) "
+                "WHERE operator = ? AND name IN ('Profit', 'Loss') GROUP BY period ORDER BY period",
+                (period, operator))]
+
+    def stakes(self, operator: str) -> dict:
+        """Latest stake of `operator` in DATA per sponsorship, as last updated by StakeUpdate."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT sponsorship, staked_wei FROM events WHERE operator = ? AND name = 'StakeUpdate' "
+                "ORDER BY block_number, log_index", (operator,)).fetchall()
+        return {row['sponsorship']: int(row['staked_wei']) / 10 ** 18 for row in rows}
+
+
+def event_row(operator: str, event) -> tuple:
+    args = event['args']
+    amount = args.get('valueIncreaseWei', args.get('valueDecreaseWei'))
+    return (event['transactionHash'].hex(), event['logIndex'], operator, event['blockNumber'], event['event'],
+            *(None if value is None else str(value) for value in (
+                amount, args.get('operatorsCutDataWei'), args.get('protocolFeeDataWei'),
+                args.get('totalStakeInSponsorshipsWei'), args.get('dataTokenBalanceWei'))),
+            args.get('sponsorship'), None if args.get('stakedWei') is None else str(args['stakedWei']))
+
+
+def is_rate_limited(error: Exception) -> bool:
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.HTTPError) and response is not None and response.status_code == 429:
+        return True
+    return any(message in str(error).lower() for message in RATE_LIMIT_ERRORS)
+
+
+def is_range_too_large(error: Exception) -> bool:
+    if is_rate_limited(error):
+        return False
+    return isinstance(error, requests.Timeout) or any(
+        message in str(error).lower() for message in RANGE_TOO_LARGE_ERRORS)
+
+
+class OperatorEventIndexer:
+    """
+    Bring the index of one operator up to a confirmed block. eth_getLogs ranges are fetched
+    `workers` at a time; a range refused by the node for its size (too many results, range too wide, timeout)
+    is fetched again at half the size, and the size doubles while ranges are sparse. A rate limited range is fetched
+    again at the same size, up to `indexer_retries` times, after `indexer_backoff` seconds doubling at every retry.
+    Only blocks `indexer_confirmations` behind the head are indexed, so a reorg never reaches the index.
+    """
+
+    def __init__(self, web3: Web3, cfg: dict, index: EventIndex, executor: ThreadPoolExecutor):
+        self.web3 = web3
+        self.index = index
+        self.executor = executor
+        self.operator = cfg['operator_contract_adress']
+        self.contract = get_operator_contract(web3, self.operator)
+        self.events = {event_abi_to_log_topic(event.abi): event
+                       for event in (getattr(self.contract.events, name)() for name in INDEXED_EVENTS)}
+        self.topics = [Web3.to_hex(topic) for topic in self.events]
+        self.start_block = cfg.get('indexer_start_block', 0)
+        self.chunk_size = cfg.get('indexer_chunk_size', 2000)
+        self.max_chunk_size = cfg.get('indexer_max_chunk_size', 100000)
+        self.workers = cfg.get('indexer_workers', 4)
+        self.retries = cfg.get('indexer_retries', 5)
+        self.backoff = cfg.get('indexer_backoff', 1)
+
+    def get_logs(self, block_range: tuple):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.web3.eth.get_logs({'address': self.operator, 'fromBlock': block_range[0],
+                                               'toBlock': block_range[1], 'topics': [self.topics]})
+            except (ValueError, requests.RequestException) as error:
+                if not is_rate_limited(error) or attempt == self.retries:
+                    return error
+                delay = self.backoff * 2 ** attempt
+                logging.debug("Indexer {}: range {}-{} rate limited, retrying in {}s".format(
+                    self.operator, *block_range, delay))
+                time.sleep(delay)
+
+    def block_timestamps(self, block_numbers: set) -> dict:
+        blocks = self.web3.provider.batch_request(
+            [('eth_getBlockByNumber', [hex(number), False]) for number in sorted(block_numbers)])
+        return {int(block['number'], 16): int(block['timestamp'], 16) for block in blocks}
+
+    def run(self, to_block: int) -> int:
+        checkpoint = self.index.checkpoint(self.operator)
+        from_block = self.start_block if checkpoint is None else checkpoint + 1
+        indexed = 0
+        while from_block <= to_block:
+            ranges = []
+            for _ in range(self.workers):
+                if from_block > to_block:
+                    break
+                ranges.append((from_block, min(from_block + self.chunk_size - 1, to_block)))
+                from_block = ranges[-1][1] + 1
+            sparse = True
+            for block_range, logs in zip(ranges, self.executor.map(self.get_logs, ranges)):
+                if isinstance(logs, Exception):
+                    if not is_range_too_large(logs) or block_range[0] == block_range[1]:
+                        raise logs
+                    # this range and the next ones of the round are fetched again, smaller
+                    self.chunk_size = max(1, (block_range[1] - block_range[0] + 1) // 2)
+                    from_block, sparse = block_range[0], False
+                    logging.debug("Indexer {}: range {}-{} refused, chunks of {} blocks".format(
+                        self.operator, *block_range, self.chunk_size))
+                    break
+                events = [self.events[log['topics'][0]].process_log(log) for log in logs]
+                self.index.store(self.operator, block_range[1], [event_row(self.operator, event) for event in events],
+                                 self.block_timestamps({event['blockNumber'] for event in events}) if events else {})
+                indexed += len(events)
+                sparse = sparse and len(logs) < SPARSE_LOGS
+            if sparse:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+        logging.info("Indexer {}: {} new events, indexed up to block {}".format(self.operator, indexed, to_block))
+        return indexed
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_event_index(cfg: dict) -> EventIndex:
+    path = cfg.get('index_path', 'harvest_index.sqlite')
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = EventIndex(path)
+        return _indexes[path]
+
+
+def index_events(cfg: dict):
+    web3 = build_web3(cfg)
+    index = get_event_index(cfg)
+    to_block = web3.eth.block_number - cfg.get('indexer_confirmations', 64)
+    with ThreadPoolExecutor(max_workers=cfg.get('indexer_workers', 4)) as executor:
+        for operator in load_operators(cfg):
+            OperatorEventIndexer(web3, operator, index, executor).run(to_block)
+
+
+def log_earnings_report(cfg: dict):
+    """Earnings history of every operator, read from the local index only."""
+    index = get_event_index(cfg)
+    for operator in load_operators(cfg):
+        address = operator['operator_contract_adress']
+        logging.info("Operator {}:".format(address))
+        for row in index.profit_by_period(address):
+            logging.info("  {period}: {withdrawals} withdrawals, profit {profit} DATA, operator's cut {operators_cut} "
+                         "DATA, protocol fee {protocol_fee} DATA, loss {loss} DATA".format(**row))
+        for sponsorship, stake in index.stakes(address).items():
+            logging.info("  staked {} DATA into {}".format(stake, sponsorship))
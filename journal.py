@@ -0,0 +1,169 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+MINED = 'mined'
+FAILED = 'failed'
+REPLACED = 'replaced'
+DROPPED = 'dropped'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    tx_hash TEXT PRIMARY KEY,
+    operator TEXT NOT NULL,
+    wallet TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    sponsorships TEXT NOT NULL,
+    max_fee_per_gas INTEGER NOT NULL,
+    max_priority_fee_per_gas INTEGER NOT NULL,
+    transaction_json TEXT NOT NULL,
+    raw_transaction TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_status ON transactions (status, wallet, nonce);
+CREATE TABLE IF NOT EXISTS nonces (
+    wallet TEXT PRIMARY KEY,
+    next_nonce INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS earnings_samples (
+    operator TEXT NOT NULL,
+    sampled_at REAL NOT NULL,
+    earnings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS earnings_samples_operator ON earnings_samples (operator, sampled_at);
+"""
+
+
+class TransactionJournal:
+    """
+    Local record of every claim transaction sent, kept in SQLite (WAL mode) so that a run killed before its
+    receipt resumes waiting for it instead of sending a new claim. It also keeps the earnings read by recent runs,
+    which the harvest scheduler fits accrual rates on.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def record(self, tx_hash: str, operator: str, wallet: str, sponsorships: list, transaction: dict,
+               raw_transaction: str):
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (tx_hash, operator, wallet, transaction['nonce'], json.dumps(sponsorships), transaction['maxFeePerGas'],
+                 transaction['maxPriorityFeePerGas'], json.dumps(transaction), raw_transaction, PENDING, now, now))
+
+    def resolve(self, wallet: str, nonce: int, tx_hash: str, status: str):
+        """`tx_hash` took `nonce` with `status`, every other version sent with this nonce was replaced."""
+        now = time.time()
+        with self._lock:
+            self.connection.execute("UPDATE transactions SET status = ?, updated_at = ? WHERE tx_hash = ?",
+                                    (status, now, tx_hash))
+            self.connection.execute("UPDATE transactions SET status = ?, updated_at = ? "
+                                    "WHERE wallet = ? AND nonce = ? AND tx_hash != ? AND status = ?",
+                                    (REPLACED, now, wallet, nonce, tx_hash, PENDING))
+
+    def discard(self, tx_hash: str):
+        """`tx_hash` was journaled but the node refused it."""
+        with self._lock:
+            self.connection.execute("UPDATE transactions SET status = ?, updated_at = ? WHERE tx_hash = ?",
+                                    (DROPPED, time.time(), tx_hash))
+
+    def drop(self, wallet: str, nonce: int):
+        with self._lock:
+            self.connection.execute("UPDATE transactions SET status = ?, updated_at = ? "
+                                    "WHERE wallet = ? AND nonce = ? AND status = ?",
+                                    (DROPPED, time.time(), wallet, nonce, PENDING))
+
+    def next_nonce(self, wallet: str):
+        with self._lock:
+            row = self.connection.execute("SELECT next_nonce FROM nonces WHERE wallet = ?", (wallet,)).fetchone()
+        return row['next_nonce'] if row else None
+
+    def store_next_nonce(self, wallet: str, next_nonce: int):
+        with self._lock:
+            self.connection.execute("INSERT OR REPLACE INTO nonces VALUES (?, ?, ?)", (wallet, next_nonce, time.time()))
+
+    def record_earnings(self, operator: str, earnings: dict, sampled_at: float, keep_seconds: float):
+        """Store the earnings of every sponsorship of `operator`, samples older than `keep_seconds` are removed."""
+        with self._lock:
+            self.connection.execute("INSERT INTO earnings_samples VALUES (?, ?, ?)", (operator, sampled_at, json.dumps(
+                {sponsorship: str(earning) for sponsorship, earning in earnings.items()})))
+            self.connection.execute("DELETE FROM earnings_samples WHERE operator = ? AND sampled_at < ?",
+                                    (operator, sampled_at - keep_seconds))
+
+    def earnings_samples(self, operator: str) -> list:
+        """Earnings samples of `operator` as (timestamp, {sponsorship: earnings}), oldest first."""
+        with self._lock:
+            rows = self.connection.execute("SELECT sampled_at, earnings FROM earnings_samples WHERE operator = ? "
+                                           "ORDER BY sampled_at", (operator,)).fetchall()
+        return [(row['sampled_at'], {sponsorship: int(earning) for sponsorship, earning in
+                                     json.loads(row['earnings']).items()}) for row in rows]
+
+    def pending(self, operator: str = None) -> list:
+        query = "SELECT * FROM transactions WHERE status = ?"
+        params = [PENDING]
+        if operator:
+            query += " AND operator = ?"
+            params.append(operator)
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(query + " ORDER BY created_at", params)]
+
+
+def reconcile(web3, journal: TransactionJournal) -> list:
+    """
+    Check every pending transaction of the journal against the chain in one batch: receipts of the pending
+    hashes and latest nonce of their wallets. Returns the transactions still in flight.
+    """
+    pending = journal.pending()
+    if not pending:
+        return []
+    wallets = sorted({row['wallet'] for row in pending})
+    results = web3.provider.batch_request(
+        [('eth_getTransactionReceipt', [row['tx_hash']]) for row in pending]
+        + [('eth_getTransactionCount', [wallet, 'latest']) for wallet in wallets])
+    receipts = results[:len(pending)]
+    latest_nonces = {wallet: int(nonce, 16) for wallet, nonce in zip(wallets, results[len(pending):])}
+
+    mined_nonces = set()
+    for row, receipt in zip(pending, receipts):
+        if receipt:
+            status = MINED if int(receipt['status'], 16) == 1 else FAILED
+            journal.resolve(row['wallet'], row['nonce'], row['tx_hash'], status)
+            mined_nonces.add((row['wallet'], row['nonce']))
+            logging.info("Journal: claim {} of operator {} {}".format(row['tx_hash'], row['operator'], status))
+    for row in pending:
+        key = (row['wallet'], row['nonce'])
+        if key not in mined_nonces and row['nonce'] < latest_nonces[row['wallet']]:
+            # the nonce was taken by a transaction this journal does not know about
+            journal.drop(*key)
+            mined_nonces.add(key)
+            logging.warning("Journal: claim {} of operator {} dropped".format(row['tx_hash'], row['operator']))
+
+    in_flight = journal.pending()
+    if in_flight:
+        logging.info("Journal: {} claim transactions still in flight".format(len(in_flight)))
+    return in_flight
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(cfg: dict) -> TransactionJournal:
+    path = cfg.get('journal_path', 'harvest_journal.sqlite')
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = TransactionJournal(path)
+        return _journals[path]
@@ -1,8 +1,11 @@
+import sys
+
 import click
 import logging
 
 from config import load_config
-from harvest_sponsorship import collect_earning
+from harvest_sponsorship import collect_earning, build_web3, load_operators
+from vault import VaultError
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -10,8 +13,46 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 @click.command()
 @click.option('--config_path', required=True, help='config path to config.yml')
-def main(config_path):
+@click.option('--status', is_flag=True, help='only log the on-chain state of every operator')
+@click.option('--daemon', is_flag=True, help='keep running and harvest when earnings are worth the gas')
+@click.option('--dry-run', is_flag=True, help='preview the DATA each claim would withdraw and its profit, send nothing')
+@click.option('--index', is_flag=True, help='update the local index of operator events')
+@click.option('--report', is_flag=True, help='log the earnings history from the local event index')
+def main(config_path, status, daemon, dry_run, index, report):
     cfg = load_config(config_path)
+    try:
+        run(cfg, status, daemon, dry_run, index, report)
+    except VaultError as error:
+        logging.fatal(error)
+        sys.exit(1)
+
+
+def run(cfg: dict, status: bool, daemon: bool, dry_run: bool = False, index: bool = False, report: bool = False):
+    if status:
+        from multicall import MULTICALL3_ADDRESS, read_operator_states, log_operator_states
+
+        operators = [operator['operator_contract_adress'] for operator in load_operators(cfg)]
+        log_operator_states(read_operator_states(build_web3(cfg), operators,
+                                                 cfg.get('multicall_address', MULTICALL3_ADDRESS)))
+        return
+    if index or report:
+        from indexer import index_events, log_earnings_report
+
+        if index:
+            index_events(cfg)
+        if report:
+            log_earnings_report(cfg)
+        return
+    if dry_run:
+        from dry_run import dry_run as preview
+
+        preview(cfg)
+        return
+    if daemon:
+        from daemon import run_daemon
+
+        run_daemon(cfg)
+        return
     collect_earning(cfg)
 
 
@@ -0,0 +1,49 @@
+import logging
+
+from web3.logs import DISCARD
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server, write_to_textfile
+
+REGISTRY = CollectorRegistry()
+
+RPC_LATENCY = Histogram('harvest_rpc_request_seconds', 'JSON-RPC round trip latency, per method sent in it',
+                        ['method'], registry=REGISTRY)
+VAULT_LATENCY = Histogram('harvest_vault_request_seconds', 'Vault request latency', ['operation'], registry=REGISTRY)
+TIME_TO_INCLUSION = Histogram('harvest_time_to_inclusion_seconds', 'Time between the first send of a claim and '
+                              'its receipt', ['operator'], registry=REGISTRY,
+                              buckets=(2, 5, 10, 20, 30, 60, 120, 300, 600, 1800))
+GAS_USED = Histogram('harvest_claim_gas_used', 'Gas used by claim transactions', ['operator'], registry=REGISTRY,
+                     buckets=(50000, 100000, 200000, 400000, 800000, 1600000, 3200000))
+EFFECTIVE_GAS_PRICE = Histogram('harvest_claim_effective_gas_price_gwei', 'Effective gas price paid by claims',
+                                ['operator'], registry=REGISTRY,
+                                buckets=(30, 50, 75, 100, 150, 200, 300, 500, 1000, 2000))
+CLAIM_COST = Counter('harvest_claim_cost_matic_total', 'MATIC spent on claim transactions', ['operator'],
+                     registry=REGISTRY)
+DATA_WITHDRAWN = Counter('harvest_data_withdrawn_total', 'DATA withdrawn by claims, operator\'s cut and protocol fee '
+                         'included', ['operator'], registry=REGISTRY)
+WALLET_BALANCE = Gauge('harvest_wallet_balance_matic', 'Signing wallet MATIC balance', ['wallet'], registry=REGISTRY)
+
+
+def observe_claim(contract, receipt):
+    """Gas and cost of a mined claim of the operator `contract`, and the DATA it withdrew from its Profit event."""
+    operator = contract.address
+    GAS_USED.labels(operator).observe(receipt['gasUsed'])
+    EFFECTIVE_GAS_PRICE.labels(operator).observe(receipt['effectiveGasPrice'] / 10 ** 9)
+    CLAIM_COST.labels(operator).inc(receipt['gasUsed'] * receipt['effectiveGasPrice'] / 10 ** 18)
+    if receipt['status'] != 1:
+        return
+    for event in contract.events.Profit().process_receipt(receipt, errors=DISCARD):
+        if event['address'] != operator:
+            continue
+        args = event['args']
+        withdrawn = args['valueIncreaseWei'] + args['operatorsCutDataWei'] + args['protocolFeeDataWei']
+        DATA_WITHDRAWN.labels(operator).inc(withdrawn / 10 ** 18)
+
+
+def serve_metrics(port: int):
+    start_http_server(port, registry=REGISTRY)
+    logging.info("Metrics exposed on :{}/metrics".format(port))
+
+
+def dump_metrics(path: str):
+    """For cron runs, in the node exporter textfile collector format."""
+    write_to_textfile(path, REGISTRY)
@@ -0,0 +1,96 @@
+import logging
+from dataclasses import dataclass, field
+
+from web3 import Web3
+
+from contracts import get_contract
+from harvest_sponsorship import get_operator_contract, transform_sponsorships_array
+from rpc import eth_call_request, decode_call_result
+
+# Multicall3 is deployed at the same address on Polygon and most EVM chains, see https://www.multicall3.com
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+@dataclass
+class OperatorState:
+    operator: str
+    value_without_earnings: int
+    total_staked_into_sponsorships: int
+    max_allowed_earnings: int
+    earnings: dict = field(default_factory=dict)
+    staked_into: dict = field(default_factory=dict)
+
+
+class MulticallReader:
+    """
+    Pack contract reads into Multicall3 aggregate3 calls of at most `max_calls` each, the aggregate calls
+    themselves being sent as one JSON-RPC batch. Failed sub calls are returned as None.
+    """
+
+    def __init__(self, web3: Web3, address: str = MULTICALL3_ADDRESS, max_calls: int = 300):
+        self.web3 = web3
+        self.contract = get_contract(web3, 'multicall3', Web3.to_checksum_address(address))
+        self.max_calls = max_calls
+
+    def aggregate(self, calls: list) -> list:
+        """`calls` is a list of (contract, fn_name, args), results are decoded with each contract abi."""
+        chunks = [calls[start:start + self.max_calls] for start in range(0, len(calls), self.max_calls)]
+        requests = [eth_call_request(self.contract, 'aggregate3',
+                                     [(contract.address, True, contract.encodeABI(fn_name=fn_name, args=list(args)))
+                                      for contract, fn_name, args in chunk])
+                    for chunk in chunks]
+        responses = self.web3.provider.batch_request(requests)
+
+        results = []
+        for chunk, response in zip(chunks, responses):
+            (call_results,) = decode_call_result(self.contract, 'aggregate3', response)
+            for (contract, fn_name, _), (success, return_data) in zip(chunk, call_results):
+                if not success:
+                    logging.warning("Multicall {} on {} failed".format(fn_name, contract.address))
+                    results.append(None)
+                    continue
+                results.append(decode_call_result(contract, fn_name, return_data))
+        return results
+
+
+def read_operator_states(web3: Web3, operator_addresses: list, multicall_address: str = MULTICALL3_ADDRESS) -> list:
+    """
+    Read valueWithoutEarnings, totalStakedIntoSponsorshipsWei, getSponsorshipsAndEarnings then stakedInto
+    of every sponsorship for all `operator_addresses`, in two multicall round trips whatever their number.
+    """
+    reader = MulticallReader(web3, multicall_address)
+    contracts = [get_operator_contract(web3, Web3.to_checksum_address(address)) for address in operator_addresses]
+
+    results = reader.aggregate([(contract, fn_name, ()) for contract in contracts
+                                for fn_name in ('valueWithoutEarnings', 'totalStakedIntoSponsorshipsWei',
+                                                'getSponsorshipsAndEarnings')])
+    states = []
+    for index, contract in enumerate(contracts):
+        value, staked, sponsorships_and_earnings = results[index * 3:index * 3 + 3]
+        if None in (value, staked, sponsorships_and_earnings):
+            continue
+        addresses, earnings, max_allowed_earnings = sponsorships_and_earnings
+        states.append(OperatorState(operator=contract.address, value_without_earnings=value[0],
+                                    total_staked_into_sponsorships=staked[0],
+                                    max_allowed_earnings=max_allowed_earnings,
+                                    earnings=dict(zip(transform_sponsorships_array(addresses), earnings))))
+
+    contracts_by_address = {contract.address: contract for contract in contracts}
+    stake_calls = [(contracts_by_address[state.operator], 'stakedInto', (sponsorship,))
+                   for state in states for sponsorship in state.earnings]
+    stakes = reader.aggregate(stake_calls) if stake_calls else []
+    states_by_address = {state.operator: state for state in states}
+    for (contract, _, (sponsorship,)), stake in zip(stake_calls, stakes):
+        if stake is not None:
+            states_by_address[contract.address].staked_into[sponsorship] = stake[0]
+    return states
+
+
+def log_operator_states(states: list):
+    for state in states:
+        logging.info("Operator {}: value {} DATA, staked {} DATA, max allowed earnings {} DATA".format(
+            state.operator, state.value_without_earnings / 10 ** 18,
+            state.total_staked_into_sponsorships / 10 ** 18, state.max_allowed_earnings / 10 ** 18))
+        for sponsorship, earning in state.earnings.items():
+            logging.info("  {}: staked {} DATA, earnings {} DATA".format(
+                sponsorship, state.staked_into.get(sponsorship, 0) / 10 ** 18, earning / 10 ** 18))
@@ -0,0 +1,87 @@
+import logging
+import threading
+
+from journal import TransactionJournal, get_journal
+
+
+class NonceManager:
+    """
+    Hand out nonces of each wallet to concurrent senders without asking the node every time. A wallet is synced once
+    from its pending transaction count, the journal claims still in flight and the next nonce persisted by previous
+    runs. Nonces persisted but neither in flight nor counted by the node are gaps left by dropped transactions, they
+    are reused first like the nonces released by a failed send.
+    """
+
+    def __init__(self, journal: TransactionJournal):
+        self.journal = journal
+        self._next = {}
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def is_synced(self, wallet: str) -> bool:
+        with self._lock:
+            return wallet in self._next
+
+    def sync(self, wallet: str, pending_count: int):
+        with self._lock:
+            self._sync(wallet, pending_count)
+
+    def _sync(self, wallet: str, pending_count: int):
+        if wallet in self._next:
+            return
+        in_flight = {row['nonce'] for row in self.journal.pending() if row['wallet'] == wallet}
+        next_nonce = max([pending_count, self.journal.next_nonce(wallet) or 0] + [nonce + 1 for nonce in in_flight])
+        self._free[wallet] = {nonce for nonce in range(pending_count, next_nonce) if nonce not in in_flight}
+        self._next[wallet] = next_nonce
+        if self._free[wallet]:
+            logging.info("Wallet {}: reusing nonces {} left by dropped transactions".format(
+                wallet, sorted(self._free[wallet])))
+
+    def allocate(self, wallet: str, web3) -> int:
+        """
+        Next nonce of `wallet`. A wallet not synced yet, or forgotten by `invalidate`, is synced first from its pending
+        transaction count read on `web3`, outside the lock.
+        """
+        pending_count = None
+        while True:
+            with self._lock:
+                if wallet not in self._next and pending_count is not None:
+                    self._sync(wallet, pending_count)
+                if wallet in self._next:
+                    return self._allocate(wallet)
+            pending_count = web3.eth.get_transaction_count(wallet, 'pending')
+
+    def _allocate(self, wallet: str) -> int:
+        if self._free[wallet]:
+            nonce = min(self._free[wallet])
+            self._free[wallet].remove(nonce)
+            return nonce
+        nonce = self._next[wallet]
+        self._next[wallet] = nonce + 1
+        self.journal.store_next_nonce(wallet, nonce + 1)
+        return nonce
+
+    def release(self, wallet: str, nonce: int):
+        """`nonce` was allocated but its transaction never reached the node, the next allocation reuses it."""
+        with self._lock:
+            if nonce < self._next.get(wallet, 0):
+                self._free[wallet].add(nonce)
+
+    def invalidate(self, wallet: str):
+        """Forget `wallet` after a "nonce too low", e.g. when it was used by another tool, to sync it again."""
+        with self._lock:
+            self._next.pop(wallet, None)
+            self._free.pop(wallet, None)
+            self.journal.store_next_nonce(wallet, 0)
+
+
+_nonce_managers = {}
+_nonce_managers_lock = threading.Lock()
+
+
+def get_nonce_manager(cfg: dict) -> NonceManager:
+    journal = get_journal(cfg)
+    with _nonce_managers_lock:
+        if id(journal) not in _nonce_managers:
+            _nonce_managers[id(journal)] = NonceManager(journal)
+        return _nonce_managers[id(journal)]
@@ -0,0 +1,77 @@
+import logging
+
+from rpc import eth_call_request
+
+
+def estimate_claim_gas_request(contract, account, sponsorships: list,
+                               function_name: str = 'withdrawEarningsFromSponsorships') -> tuple:
+    _, (call, _) = eth_call_request(contract, function_name, sponsorships)
+    return 'eth_estimateGas', [dict(call, **{'from': account.address})]
+
+
+def plan_claim_batches(web3, contract, account, sponsorships: list, gas_budget: int,
+                       function_name: str = 'withdrawEarningsFromSponsorships') -> tuple:
+    """
+    Split `sponsorships` into claims estimated under `gas_budget` each, bisecting any group that reverts
+    (NoEarnings, NotMyStakedSponsorship, ...) or is over budget down to the sponsorships responsible.
+    Every level of the bisection is estimated in one batch, then the surviving groups are packed back into as few
+    claims as fit the budget. Returns the batches as (sponsorships, gas estimate) and the sponsorships that revert
+    on their own.
+    """
+    batches, rejected, samples = [], [], []
+    groups = [sponsorships]
+    while groups:
+        estimates = web3.provider.batch_request(
+            [estimate_claim_gas_request(contract, account, group, function_name) for group in groups],
+            raise_errors=False)
+        next_groups = []
+        for group, estimate in zip(groups, estimates):
+            if isinstance(estimate, ValueError):
+                if len(group) == 1:
+                    logging.warning("Sponsorship {} reverts on claim, skipped: {}".format(group[0], estimate))
+                    rejected.append(group[0])
+                    continue
+            else:
+                samples.append((len(group), int(estimate, 16)))
+                if int(estimate, 16) <= gas_budget or len(group) == 1:
+                    batches.append((group, int(estimate, 16)))
+                    continue
+            middle = len(group) // 2
+            next_groups += [group[:middle], group[middle:]]
+        groups = next_groups
+    batches.sort(key=lambda batch: sponsorships.index(batch[0][0]))
+    return repack_batches(web3, contract, account, batches, gas_budget, function_name, samples), rejected
+
+
+def claim_gas_model(samples: list) -> tuple:
+    """Base and per sponsorship gas of a claim, fitted on (sponsorship count, gas estimate) samples."""
+    counts = [count for count, _ in samples]
+    mean_count, mean_gas = sum(counts) / len(samples), sum(gas for _, gas in samples) / len(samples)
+    variance = sum((count - mean_count) ** 2 for count in counts)
+    if not variance:
+        # a single claim size, the base gas is counted again for every sponsorship
+        return 0, max(gas / count for count, gas in samples)
+    per_sponsorship = max(sum((count - mean_count) * (gas - mean_gas) for count, gas in samples) / variance, 0)
+    return max(mean_gas - per_sponsorship * mean_count, 0), per_sponsorship
+
+
+def repack_batches(web3, contract, account, batches: list, gas_budget: int, function_name: str,
+                   samples: list) -> list:
+    """
+    Pack the sponsorships of the `batches` left by the bisection greedily into as few claims as the gas fitted on
+    `samples` allows under `gas_budget`, so that isolating a reverting sponsorship does not leave the others split
+    into several claims. The packed claims are estimated in one batch, and the bisection batches are kept when one
+    of them reverts or goes over budget.
+    """
+    base_gas, sponsorship_gas = claim_gas_model(samples)
+    survivors = [sponsorship for group, _ in batches for sponsorship in group]
+    per_claim = max(int((gas_budget - base_gas) // sponsorship_gas) if sponsorship_gas else len(survivors), 1)
+    groups = [survivors[index:index + per_claim] for index in range(0, len(survivors), per_claim)]
+    if len(groups) >= len(batches):
+        return batches
+    estimates = web3.provider.batch_request(
+        [estimate_claim_gas_request(contract, account, group, function_name) for group in groups], raise_errors=False)
+    if any(isinstance(estimate, ValueError) or int(estimate, 16) > gas_budget for estimate in estimates):
+        return batches
+    logging.info("{} claims repacked into {} under {} gas".format(len(batches), len(groups), gas_budget))
+    return [(group, int(estimate, 16)) for group, estimate in zip(groups, estimates)]
@@ -0,0 +1,144 @@
+import logging
+
+from web3 import Web3
+
+from contracts import get_contract
+from fees import fee_history_request, parse_fee_history, operator_fee_quote, estimate_claim_cost
+from metrics import WALLET_BALANCE
+from rpc import eth_call_request, decode_call_result
+from undelegation import queue_length_requests
+
+READY = 'ready'
+LOW = 'low'
+INSUFFICIENT = 'insufficient'
+UNKNOWN = 'unknown'
+
+
+def claim_count(cfg: dict, addresses: list, earnings: list) -> int:
+    """Sponsorships the next claim of an operator would hold: every one with earnings, or `sponsorship_to_claim`."""
+    wanted = {Web3.to_checksum_address(address) for address in cfg.get('sponsorship_to_claim') or addresses}
+    return sum(1 for address, earning in zip(addresses, earnings)
+               if earning and Web3.to_checksum_address(address) in wanted)
+
+
+def operator_requests(contract) -> list:
+    """Reads of an operator needed before its claim: its sponsorships with their earnings and the undelegation queue."""
+    return [eth_call_request(contract, 'getSponsorshipsAndEarnings'), *queue_length_requests(contract)]
+
+
+def operator_context(cfg: dict, contract, fee_history: dict, chain_id: str, balance: str, results: list) -> dict:
+    """The claim context of an operator (see fetch_harvest_context) from the results of `operator_requests`."""
+    raw_earnings, queue_current, queue_last = results
+    addresses, earnings, max_allowed_earnings = decode_call_result(contract, 'getSponsorshipsAndEarnings', raw_earnings)
+    fee_quote = operator_fee_quote(cfg, fee_history)
+    return {
+        'fee_quote': fee_quote,
+        'gas_price': fee_quote['expected_gas_price'],
+        'chain_id': int(chain_id, 16),
+        'balance': int(balance, 16),
+        'earnings': {Web3.to_checksum_address(address): earning for address, earning in zip(addresses, earnings)},
+        'max_allowed_earnings': max_allowed_earnings,
+        'queue_length': int(queue_last, 16) - int(queue_current, 16),
+    }
+
+
+def check_wallets(web3: Web3, operators: list, wallet_addresses: list) -> list:
+    """
+    Readiness of every signing wallet of the fleet, read in one batch: fee history, chain id, balance, pending and
+    latest nonces of each wallet and the sponsorships and undelegation queue of each operator. A wallet is
+    `insufficient` when its balance is under `min_balance_matic` or cannot cover the gas limit of the next claims of
+    its operators at maxFeePerGas, which the node requires to accept them, and `low` when it does not cover their next
+    `readiness_harvests` claims at the expected gas price. A failed read does not stop the check: the wallet is
+    `unknown` when its own reads or the fee history fail, an operator whose reads fail is listed in `failed_operators`.
+    Returns one report per wallet, with the operators it signs for and the claim context of each operator read.
+    """
+    wallets = {}
+    for operator, wallet_address in zip(operators, wallet_addresses):
+        wallets.setdefault(wallet_address, []).append(operator)
+    calls = [fee_history_request(), ('eth_chainId', [])]
+    for wallet_address in wallets:
+        calls += [('eth_getBalance', [wallet_address, 'latest']),
+                  ('eth_getTransactionCount', [wallet_address, 'pending']),
+                  ('eth_getTransactionCount', [wallet_address, 'latest'])]
+    contracts = {}
+    for operator in operators:
+        contract = get_contract(web3, 'operator', operator['operator_contract_adress'])
+        contracts[operator['operator_contract_adress']] = contract
+        calls += operator_requests(contract)
+    fee_history, chain_id, *results = web3.provider.batch_request(calls, raise_errors=False)
+    fee_error = next((result for result in (fee_history, chain_id) if isinstance(result, ValueError)), None)
+    if fee_error is None:
+        fee_history = parse_fee_history(fee_history)
+    wallet_results = {wallet_address: results[3 * index:3 * index + 3] for index, wallet_address in enumerate(wallets)}
+    operator_results = {address: results[3 * len(wallets) + 3 * index:3 * len(wallets) + 3 * index + 3]
+                        for index, address in enumerate(contracts)}
+
+    reports = []
+    for wallet_address, wallet_operators in wallets.items():
+        report = {
+            'wallet': wallet_address,
+            'operators': [operator['operator_contract_adress'] for operator in wallet_operators],
+            'status': UNKNOWN,
+            'error': None,
+            'balance': None,
+            'next_claim_cost': 0,
+            'projected_cost': 0,
+            'pending_transactions': None,
+            'nonce': None,
+            'contexts': {},
+            'failed_operators': {},
+        }
+        reports.append(report)
+        errors = [result for result in wallet_results[wallet_address] if isinstance(result, ValueError)]
+        for operator in wallet_operators:
+            address = operator['operator_contract_adress']
+            error = next((result for result in operator_results[address] if isinstance(result, ValueError)), None)
+            if error is not None:
+                report['failed_operators'][address] = error
+        if errors:
+            report['error'] = errors[0]
+            continue
+        balance, pending_nonce, latest_nonce = wallet_results[wallet_address]
+        report.update(balance=int(balance, 16), pending_transactions=int(pending_nonce, 16) - int(latest_nonce, 16),
+                      nonce=int(pending_nonce, 16))
+        WALLET_BALANCE.labels(wallet_address).set(report['balance'] / 10 ** 18)
+        if fee_error is not None:
+            report['error'] = fee_error
+            continue
+
+        low_balance = 0
+        for operator in wallet_operators:
+            address = operator['operator_contract_adress']
+            low_balance = max(low_balance, int(operator.get('min_balance_matic', 0.5) * 10 ** 18))
+            if address in report['failed_operators']:
+                continue
+            context = operator_context(operator, contracts[address], fee_history, chain_id, balance,
+                                       operator_results[address])
+            report['contexts'][address] = context
+            count = max(claim_count(operator, list(context['earnings']), list(context['earnings'].values())), 1)
+            report['next_claim_cost'] += int(estimate_claim_cost(operator, count, context['fee_quote']['maxFeePerGas'])
+                                             * operator.get('gas_limit_multiplier', 1.5))
+            report['projected_cost'] += operator.get('readiness_harvests', 3) * estimate_claim_cost(
+                operator, count, context['gas_price'])
+        if report['balance'] < max(report['next_claim_cost'], low_balance):
+            report['status'] = INSUFFICIENT
+        elif report['balance'] < report['projected_cost']:
+            report['status'] = LOW
+        else:
+            report['status'] = READY
+    return reports
+
+
+def log_readiness(reports: list):
+    for report in reports:
+        for operator, error in report['failed_operators'].items():
+            logging.error("Operator {} not read, it will not be harvested: {}".format(operator, error))
+        if report['status'] == UNKNOWN:
+            logging.warning("Wallet {} unknown, its operators read their own state before harvesting: {}".format(
+                report['wallet'], report['error']))
+            continue
+        log = {READY: logging.info, LOW: logging.warning, INSUFFICIENT: logging.error}[report['status']]
+        log("Wallet {} {}: balance {} MATIC, next claim needs {} MATIC, next harvests cost {} MATIC, "
+            "{} pending transactions, operators {}".format(
+                report['wallet'], report['status'], report['balance'] / 10 ** 18, report['next_claim_cost'] / 10 ** 18,
+                report['projected_cost'] / 10 ** 18, report['pending_transactions'], ', '.join(report['operators'])))
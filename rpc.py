@@ -0,0 +1,245 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, as_completed, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+from web3._utils.abi import get_abi_output_types
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from hexbytes import HexBytes
+
+from metrics import RPC_LATENCY
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class BatchingHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider sending its requests over one pooled keep-alive session, able to send independent
+    reads as a single JSON-RPC batch, and counting requests and round trips for the run report.
+    """
+
+    def __init__(self, endpoint_uri: str, pool_size: int = 16, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.session = pooled_session(pool_size)
+        self.request_count = 0
+        self.round_trip_count = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, requests_sent: int):
+        with self._stats_lock:
+            self.request_count += requests_sent
+            self.round_trip_count += 1
+
+    def _post(self, payload: bytes, broadcast: bool = False) -> bytes:
+        response = self.session.post(self.endpoint_uri, data=payload, **self.get_request_kwargs())
+        response.raise_for_status()
+        return response.content
+
+    def _timed(self, methods: set, payload: bytes, broadcast: bool = False) -> bytes:
+        started_at = time.monotonic()
+        content = self._post(payload, broadcast=broadcast)
+        latency = time.monotonic() - started_at
+        for method in methods:
+            RPC_LATENCY.labels(method).observe(latency)
+        return content
+
+    def make_request(self, method, params):
+        self._count(1)
+        return self.decode_rpc_response(self._timed({method}, self.encode_rpc_request(method, params),
+                                                    broadcast=method == 'eth_sendRawTransaction'))
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        """
+        Send `calls`, a list of (method, params), in one round trip and return their results in order.
+        With `raise_errors` False, a failed call gets a ValueError in place of its result instead of failing the batch.
+        Falls back to one request per call for endpoints refusing batches.
+        """
+        payload = [{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': request_id}
+                   for request_id, (method, params) in enumerate(calls)]
+        self._count(len(calls))
+        responses = json.loads(self._timed({method for method, _ in calls},
+                                           FriendlyJsonSerde().json_encode(payload, cls=Web3JsonEncoder).encode()))
+        if not isinstance(responses, list):
+            logging.warning("Endpoint {} does not support batch requests: {}".format(self.endpoint_uri, responses))
+            responses = [dict(self.make_request(method, params), id=request_id)
+                         for request_id, (method, params) in enumerate(calls)]
+
+        results = [None] * len(calls)
+        for response in responses:
+            if 'error' in response:
+                if raise_errors:
+                    raise ValueError(response['error'])
+                results[response['id']] = ValueError(response['error'])
+                continue
+            results[response['id']] = response['result']
+        return results
+
+    def stats(self) -> dict:
+        return {'requests': self.request_count, 'round_trips': self.round_trip_count}
+
+
+class Endpoint:
+    def __init__(self, url: str, session: requests.Session):
+        self.url = url
+        self.session = session
+        self.ewma_latency = None
+        self.latencies = deque(maxlen=100)
+        self.consecutive_failures = 0
+        self.open_until = 0
+        self.in_flight = []
+
+    def expected_latency(self, now: float):
+        """EWMA latency, or how long the oldest request in flight has been waiting when longer. None if never used."""
+        waited = now - min(self.in_flight) if self.in_flight else None
+        if self.ewma_latency is None:
+            return waited
+        return max(self.ewma_latency, waited or 0)
+
+    def p95_latency(self):
+        if len(self.latencies) < 20:
+            return None
+        return sorted(self.latencies)[int(len(self.latencies) * 0.95) - 1]
+
+
+class PooledHTTPProvider(BatchingHTTPProvider):
+    """
+    BatchingHTTPProvider over several endpoints ranked by EWMA latency, a request still in flight counting as
+    its waiting time so far. An endpoint failing `circuit_failures` times in a row is left aside for
+    `circuit_cooldown` seconds. Reads go to the best endpoint and are hedged to the next one when they take longer
+    than the endpoint p95 latency (`hedge_delay` until enough samples), a failure moving on to the next endpoint
+    right away. Raw transactions are broadcast to the `broadcast_count` best endpoints at once. Every attempt runs
+    on its own thread, so requests left behind by a hedge never hold up later ones.
+    """
+
+    def __init__(self, endpoint_uris: list, pool_size: int = 16, ewma_alpha: float = 0.3, circuit_failures: int = 3,
+                 circuit_cooldown: float = 30, hedge_delay: float = 1.0, broadcast_count: int = 3,
+                 request_timeout: float = 10, **kwargs):
+        super().__init__(endpoint_uris[0], pool_size=pool_size, **kwargs)
+        self.endpoints = [Endpoint(url, pooled_session(pool_size)) for url in endpoint_uris]
+        self.ewma_alpha = ewma_alpha
+        self.circuit_failures = circuit_failures
+        self.circuit_cooldown = circuit_cooldown
+        self.hedge_delay = hedge_delay
+        self.broadcast_count = broadcast_count
+        self.request_timeout = request_timeout
+        self._endpoints_lock = threading.Lock()
+
+    def ranked_endpoints(self) -> list:
+        """
+        Closed circuits first, by expected latency. Endpoints without any answer yet come after the measured ones in
+        configuration order, those still waiting on their first answer last, so a stuck endpoint is not picked again.
+        """
+        now = time.monotonic()
+        with self._endpoints_lock:
+            available = [endpoint for endpoint in self.endpoints if endpoint.open_until <= now]
+            if not available:
+                # every circuit is open, try them all rather than failing
+                available = list(self.endpoints)
+            return sorted(available, key=lambda endpoint: (endpoint.ewma_latency is None,
+                                                           endpoint.expected_latency(now) or 0))
+
+    def _submit(self, endpoint: Endpoint, payload: bytes) -> Future:
+        future = Future()
+
+        def post():
+            try:
+                future.set_result(self._timed_post(endpoint, payload))
+            except Exception as error:
+                future.set_exception(error)
+
+        threading.Thread(target=post, daemon=True).start()
+        return future
+
+    def _timed_post(self, endpoint: Endpoint, payload: bytes) -> bytes:
+        started_at = time.monotonic()
+        with self._endpoints_lock:
+            endpoint.in_flight.append(started_at)
+        try:
+            response = endpoint.session.post(endpoint.url, data=payload, timeout=self.request_timeout,
+                                             **self.get_request_kwargs())
+            response.raise_for_status()
+        except requests.RequestException:
+            with self._endpoints_lock:
+                # a failure ranks the endpoint as if it had timed out
+                self._record_latency(endpoint, self.request_timeout)
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.circuit_failures:
+                    endpoint.open_until = time.monotonic() + self.circuit_cooldown
+                    logging.warning("RPC endpoint {} failing, left aside for {}s".format(
+                        endpoint.url, self.circuit_cooldown))
+            raise
+        finally:
+            with self._endpoints_lock:
+                endpoint.in_flight.remove(started_at)
+        with self._endpoints_lock:
+            endpoint.consecutive_failures = 0
+            self._record_latency(endpoint, time.monotonic() - started_at)
+        return response.content
+
+    def _record_latency(self, endpoint: Endpoint, latency: float):
+        endpoint.latencies.append(latency)
+        if endpoint.ewma_latency is None:
+            endpoint.ewma_latency = latency
+        else:
+            endpoint.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma_latency
+
+    def _post(self, payload: bytes, broadcast: bool = False) -> bytes:
+        if broadcast:
+            return self._broadcast(payload)
+        candidates = self.ranked_endpoints()
+        pending, error = {}, None
+        while candidates or pending:
+            if candidates:
+                endpoint = candidates.pop(0)
+                pending[self._submit(endpoint, payload)] = endpoint
+            hedge_delay = (endpoint.p95_latency() or self.hedge_delay) if candidates else None
+            done, _ = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                try:
+                    return future.result()
+                except requests.RequestException as request_error:
+                    error = request_error
+        raise error
+
+    def _broadcast(self, payload: bytes) -> bytes:
+        futures = [self._submit(endpoint, payload) for endpoint in self.ranked_endpoints()[:self.broadcast_count]]
+        first_response, error = None, None
+        for future in as_completed(futures):
+            try:
+                content = future.result()
+            except requests.RequestException as request_error:
+                error = request_error
+                continue
+            # other endpoints answer "already known" once one of them relayed the transaction
+            if 'error' not in json.loads(content):
+                return content
+            first_response = first_response or content
+        if first_response is None:
+            raise error
+        return first_response
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats['endpoints'] = {endpoint.url: endpoint.ewma_latency for endpoint in self.endpoints}
+        return stats
+
+
+def eth_call_request(contract, fn_name: str, *args, block: str = 'latest') -> tuple:
+    return 'eth_call', [{'to': contract.address, 'data': contract.encodeABI(fn_name=fn_name, args=list(args))}, block]
+
+
+def decode_call_result(contract, fn_name: str, result: str) -> tuple:
+    output_types = get_abi_output_types(contract.get_function_by_name(fn_name).abi)
+    return contract.w3.codec.decode(output_types, HexBytes(result))
@@ -0,0 +1,67 @@
+import math
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+def fit_accrual_rates(samples: list) -> dict:
+    """
+    Accrual rate in wei per second of every sponsorship, from earnings `samples` as (timestamp, {sponsorship: earnings})
+    oldest first. Intervals in which the earnings of a sponsorship dropped (claimed in between) are left out.
+    """
+    accrued, elapsed = {}, {}
+    for (previous_at, previous), (sampled_at, earnings) in zip(samples, samples[1:]):
+        for sponsorship, earning in earnings.items():
+            if sponsorship in previous and earning >= previous[sponsorship] and sampled_at > previous_at:
+                accrued[sponsorship] = accrued.get(sponsorship, 0) + earning - previous[sponsorship]
+                elapsed[sponsorship] = elapsed.get(sponsorship, 0) + sampled_at - previous_at
+    return {sponsorship: accrued[sponsorship] / elapsed[sponsorship] for sponsorship in accrued}
+
+
+def harvest_window(claim_cost: float, rate: float, holding_cost: float, tolerance: float) -> tuple:
+    """
+    Interval between claims minimizing `claim_cost` / T + `holding_cost` * `rate` * T / 2, the gas of the claim
+    against the yield lost by leaving the earnings unclaimed, with the range of intervals costing at most
+    `tolerance` more than this optimum. Returns (shortest, optimal, longest) in seconds.
+    """
+    optimum = math.sqrt(2 * claim_cost / (holding_cost * rate))
+    spread = math.sqrt((1 + tolerance) ** 2 - 1)
+    return optimum * (1 + tolerance - spread), optimum, optimum * (1 + tolerance + spread)
+
+
+def plan_harvests(cfg: dict, rates: dict, earnings: dict, max_allowed_earnings: int, claim_cost: int,
+                  now: float) -> list:
+    """
+    Group the sponsorships into claims sharing a transaction. Every sponsorship has a window of claim times, from its
+    `harvest_window` (standalone `claim_cost` in MATIC wei, earnings worth `data_price_in_matic`, which is required,
+    and yielding `earnings_yield` per year once claimed) counted from its last claim, estimated as its earnings
+    divided by its rate. The window ends before the earnings reach `max_allowed_earnings_margin` of
+    maxAllowedEarnings. Windows are covered by as few claim times as possible, each claim at the end of the earliest
+    window it covers. Returns the claims as dicts, earliest first.
+    """
+    if not cfg.get('data_price_in_matic'):
+        raise ValueError("The harvest scheduler needs data_price_in_matic to weigh claim gas against idle earnings")
+    holding_cost = cfg.get('earnings_yield', 0.1) / SECONDS_PER_YEAR * cfg['data_price_in_matic']
+    tolerance = cfg.get('schedule_tolerance', 0.1)
+    cap = max_allowed_earnings * cfg.get('max_allowed_earnings_margin', 0.9)
+    windows = []
+    for sponsorship, rate in rates.items():
+        if sponsorship not in earnings or rate <= 0:
+            continue
+        shortest, _, longest = harvest_window(claim_cost, rate, holding_cost, tolerance)
+        longest = min(longest, cap / rate)
+        age = earnings[sponsorship] / rate
+        windows.append((now + min(shortest, longest) - age, now + longest - age, sponsorship))
+
+    claims = []
+    windows.sort(key=lambda window: window[1])
+    while windows:
+        claim_at = windows[0][1]
+        group = [window for window in windows if window[0] <= claim_at]
+        windows = [window for window in windows if window[0] > claim_at]
+        claims.append({
+            'claim_at': claim_at,
+            'sponsorships': [sponsorship for _, _, sponsorship in group],
+            'expected_earnings': sum(earnings[sponsorship] + rates[sponsorship] * max(claim_at - now, 0)
+                                     for _, _, sponsorship in group),
+        })
+    return claims
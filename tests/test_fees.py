@@ -0,0 +1,34 @@
+from fees import MAX_BASE_FEE_CHANGE, base_fee_growth, quote_fees, tip_quantile
+
+GWEI = 10 ** 9
+
+
+def fee_history(base_fees: list, lowest_tips: list) -> dict:
+    return {'base_fees': [base_fee * GWEI for base_fee in base_fees],
+            'rewards': [[tip * GWEI] for tip in lowest_tips]}
+
+
+def test_tip_quantile_reaches_confidence_within_target():
+    for target_blocks in (1, 2, 5, 20):
+        quantile = tip_quantile(target_blocks, 0.9)
+        assert abs(1 - (1 - quantile) ** target_blocks - 0.9) < 1e-9
+
+
+def test_faster_targets_bid_higher_tips():
+    history = fee_history([100] * 21, list(range(30, 50)))
+    tips = [quote_fees(history, strategy)['maxPriorityFeePerGas'] for strategy in ('cheap', 'standard', 'fast')]
+    assert tips == sorted(tips) and tips[0] < tips[-1]
+    assert quote_fees(history, 'cheap', min_priority_fee=45 * GWEI)['maxPriorityFeePerGas'] == 45 * GWEI
+
+
+def test_base_fee_headroom_follows_history_within_eip1559_bounds():
+    flat = [100] * 21
+    assert base_fee_growth(flat, 5) == MAX_BASE_FEE_CHANGE
+    rising = [100 * 1.1 ** block for block in range(21)]
+    assert abs(base_fee_growth(rising, 5) - 1.1 ** 5) < 1e-9
+    assert base_fee_growth([100, 1000] + [1000] * 19, 2) == MAX_BASE_FEE_CHANGE ** 2
+
+    quote = quote_fees(fee_history(rising, [30] * 20), 'standard')
+    next_base_fee = rising[-1] * GWEI
+    assert quote['expected_gas_price'] == next_base_fee + 30 * GWEI
+    assert quote['maxFeePerGas'] == int(next_base_fee * base_fee_growth([fee * GWEI for fee in rising], 5)) + 30 * GWEI
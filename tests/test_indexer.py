@@ -0,0 +1,68 @@
+import requests
+from web3 import Web3
+
+from indexer import EventIndex, OperatorEventIndexer, is_range_too_large, is_rate_limited
+
+
+def http_error(status: int, reason: str) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError("{} Client Error: {} for url: https://polygon-rpc.com".format(status, reason),
+                              response=response)
+
+
+def test_rate_limits_are_not_range_errors():
+    for error in (http_error(429, 'Too Many Requests'),
+                  requests.HTTPError('429 Client Error: Too Many Requests for url: https://polygon-rpc.com'),
+                  ValueError({'code': -32005, 'message': 'daily request count exceeded, request rate limited'}),
+                  ValueError({'code': -32090, 'message': 'Too many requests, reason: call rate limit exhausted'})):
+        assert is_rate_limited(error)
+        assert not is_range_too_large(error)
+
+
+def test_range_errors():
+    for error in (ValueError({'code': -32005, 'message': 'query returned more than 10000 results'}),
+                  ValueError({'code': -32000, 'message': 'block range is too wide'}),
+                  ValueError({'code': -32062, 'message': 'Block range is too large'}),
+                  ValueError({'code': -32600, 'message': 'exceed maximum block range: 5000'}),
+                  ValueError({'code': -32602, 'message': 'Log response size exceeded.'}),
+                  requests.Timeout('Read timed out')):
+        assert is_range_too_large(error)
+        assert not is_rate_limited(error)
+    assert not is_range_too_large(ValueError({'code': -32000, 'message': 'execution reverted'}))
+
+
+class RateLimitedEth:
+    def __init__(self, refusals: int):
+        self.refusals = refusals
+        self.ranges = []
+
+    def get_logs(self, log_filter: dict) -> list:
+        self.ranges.append((log_filter['fromBlock'], log_filter['toBlock']))
+        if self.refusals:
+            self.refusals -= 1
+            raise http_error(429, 'Too Many Requests')
+        return []
+
+
+class StubWeb3:
+    def __init__(self, eth: RateLimitedEth):
+        self.eth = eth
+
+
+class InlineExecutor:
+    def map(self, function, items):
+        return map(function, items)
+
+
+def test_rate_limited_ranges_are_retried_without_shrinking(tmp_path, monkeypatch):
+    monkeypatch.setattr('indexer.time.sleep', lambda delay: None)
+    eth = RateLimitedEth(refusals=3)
+    operator = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+    indexer = OperatorEventIndexer(Web3(), {'operator_contract_adress': operator, 'indexer_chunk_size': 1000,
+                                            'indexer_workers': 1},
+                                   EventIndex(str(tmp_path / 'index.sqlite')), InlineExecutor())
+    indexer.web3 = StubWeb3(eth)
+
+    assert indexer.run(1999) == 0
+    assert eth.ranges == [(0, 999)] * 4 + [(1000, 1999)]
@@ -0,0 +1,76 @@
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from journal import DROPPED, FAILED, MINED, PENDING, REPLACED, TransactionJournal, reconcile
+
+WALLET = Web3.to_checksum_address('0x{:040x}'.format(0x0c << 152))
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+
+
+class StubReceiptProvider(BaseProvider):
+    """Stand-in for a node knowing the receipts of `receipts` by hash and the latest nonce of every wallet."""
+
+    def __init__(self, receipts: dict, latest_nonce: int):
+        self.receipts = receipts
+        self.latest_nonce = latest_nonce
+        self.batches = []
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        self.batches.append(calls)
+        results = []
+        for method, params in calls:
+            if method == 'eth_getTransactionReceipt':
+                results.append(self.receipts.get(params[0]))
+            else:
+                assert method == 'eth_getTransactionCount' and params == [WALLET, 'latest']
+                results.append(hex(self.latest_nonce))
+        return results
+
+
+def tx_hash(nonce: int, version: int = 0) -> str:
+    return '0x{:062x}{:02x}'.format(nonce, version)
+
+
+def journal_claim(journal: TransactionJournal, nonce: int, version: int = 0):
+    transaction = {'nonce': nonce, 'maxFeePerGas': 100 + version, 'maxPriorityFeePerGas': 30 + version}
+    journal.record(tx_hash(nonce, version), OPERATOR, WALLET, [], transaction, '0x')
+
+
+def statuses(journal: TransactionJournal) -> dict:
+    rows = journal.connection.execute("SELECT tx_hash, status FROM transactions").fetchall()
+    return {row['tx_hash']: row['status'] for row in rows}
+
+
+def test_reconcile_resolves_every_outcome_in_one_batch(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.sqlite'))
+    journal_claim(journal, 3)
+    journal_claim(journal, 4)
+    journal_claim(journal, 4, version=1)
+    journal_claim(journal, 5)
+    journal_claim(journal, 6)
+    journal_claim(journal, 7)
+    provider = StubReceiptProvider({tx_hash(3): {'status': '0x1'}, tx_hash(4, version=1): {'status': '0x1'},
+                                    tx_hash(5): {'status': '0x0'}}, latest_nonce=7)
+
+    in_flight = reconcile(Web3(provider), journal)
+
+    assert len(provider.batches) == 1
+    assert statuses(journal) == {
+        tx_hash(3): MINED,
+        # the bumped replacement was mined, the first version of the claim was replaced
+        tx_hash(4): REPLACED,
+        tx_hash(4, version=1): MINED,
+        tx_hash(5): FAILED,
+        # nonce 6 was taken by a transaction the journal does not know about
+        tx_hash(6): DROPPED,
+        tx_hash(7): PENDING,
+    }
+    assert [row['tx_hash'] for row in in_flight] == [tx_hash(7)]
+
+
+def test_reconcile_without_pending_claims_sends_nothing(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.sqlite'))
+    provider = StubReceiptProvider({}, latest_nonce=0)
+
+    assert reconcile(Web3(provider), journal) == []
+    assert provider.batches == []
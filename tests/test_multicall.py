@@ -0,0 +1,84 @@
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+from web3.providers import BaseProvider
+
+from contracts import get_contract
+from multicall import MULTICALL3_ADDRESS, MulticallReader, read_operator_states
+
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+FAILING_OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152 | 1))
+SPONSORSHIPS = [Web3.to_checksum_address('0x{:040x}'.format(0x5b << 152 | index)) for index in range(3)]
+
+
+class StubAggregatorProvider(BaseProvider):
+    """
+    Stand-in for a node with Multicall3 deployed: decodes every aggregate3 of a batch, answers its sub calls from
+    the state of the operators and encodes the results as aggregate3 would. Sub calls to other addresses fail.
+    """
+
+    def __init__(self, operators: dict):
+        self.operators = operators
+        self.batches = []
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        self.batches.append(calls)
+        web3 = Web3(self)
+        multicall = get_contract(web3, 'multicall3', MULTICALL3_ADDRESS)
+        results = []
+        for method, (transaction, _) in calls:
+            assert method == 'eth_call' and transaction['to'] == MULTICALL3_ADDRESS
+            _, arguments = multicall.decode_function_input(transaction['data'])
+            call_results = [self.sub_call(web3, Web3.to_checksum_address(call['target']), call['callData'])
+                            for call in arguments['calls']]
+            output_types = get_abi_output_types(multicall.get_function_by_name('aggregate3').abi)
+            results.append(Web3.to_hex(web3.codec.encode(output_types, [call_results])))
+        return results
+
+    def sub_call(self, web3: Web3, target: str, call_data: bytes) -> tuple:
+        if target not in self.operators:
+            return False, b''
+        contract = get_contract(web3, 'operator', target)
+        function, arguments = contract.decode_function_input(call_data)
+        value = self.operators[target][function.fn_name]
+        if callable(value):
+            value = value(*arguments.values())
+        output_types = get_abi_output_types(function.abi)
+        return True, web3.codec.encode(output_types, value if isinstance(value, tuple) else (value,))
+
+
+def operator_state() -> dict:
+    return {
+        'valueWithoutEarnings': 5000 * 10 ** 18,
+        'totalStakedIntoSponsorshipsWei': 3000 * 10 ** 18,
+        'getSponsorshipsAndEarnings': (SPONSORSHIPS, [index * 10 ** 18 for index in range(3)], 100 * 10 ** 18),
+        'stakedInto': lambda sponsorship: 1000 * 10 ** 18 + SPONSORSHIPS.index(sponsorship),
+    }
+
+
+def test_aggregate_round_trips_calls_in_order():
+    provider = StubAggregatorProvider({OPERATOR: operator_state()})
+    web3 = Web3(provider)
+    contract = get_contract(web3, 'operator', OPERATOR)
+    reader = MulticallReader(web3, max_calls=2)
+
+    results = reader.aggregate([(contract, 'valueWithoutEarnings', ()),
+                                (contract, 'stakedInto', (SPONSORSHIPS[2],)),
+                                (contract, 'totalStakedIntoSponsorshipsWei', ())])
+
+    assert results == [(5000 * 10 ** 18,), (1000 * 10 ** 18 + 2,), (3000 * 10 ** 18,)]
+    # two aggregate3 calls of at most max_calls, sent in a single batch
+    assert len(provider.batches) == 1 and len(provider.batches[0]) == 2
+
+
+def test_read_operator_states_skips_failed_operators():
+    provider = StubAggregatorProvider({OPERATOR: operator_state()})
+    states = read_operator_states(Web3(provider), [OPERATOR, FAILING_OPERATOR])
+
+    assert len(provider.batches) == 2
+    assert [state.operator for state in states] == [OPERATOR]
+    state = states[0]
+    assert state.value_without_earnings == 5000 * 10 ** 18
+    assert state.total_staked_into_sponsorships == 3000 * 10 ** 18
+    assert state.max_allowed_earnings == 100 * 10 ** 18
+    assert state.earnings == {sponsorship: index * 10 ** 18 for index, sponsorship in enumerate(SPONSORSHIPS)}
+    assert state.staked_into == {sponsorship: 1000 * 10 ** 18 + index for index, sponsorship in enumerate(SPONSORSHIPS)}
@@ -0,0 +1,72 @@
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from journal import TransactionJournal
+from nonce import NonceManager
+
+WALLET = Web3.to_checksum_address('0x{:040x}'.format(0x0c << 152))
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+
+
+class StubNonceProvider(BaseProvider):
+    """Stand-in for a node answering the pending transaction count of every wallet with `pending_count`."""
+
+    def __init__(self, pending_count: int):
+        self.pending_count = pending_count
+        self.requests = 0
+
+    def make_request(self, method: str, params: list) -> dict:
+        assert method == 'eth_getTransactionCount' and params[1] == 'pending'
+        self.requests += 1
+        return {'jsonrpc': '2.0', 'id': self.requests, 'result': hex(self.pending_count)}
+
+
+def journal_claim(journal: TransactionJournal, nonce: int):
+    transaction = {'nonce': nonce, 'maxFeePerGas': 1, 'maxPriorityFeePerGas': 1}
+    journal.record('0x{:064x}'.format(nonce), OPERATOR, WALLET, [], transaction, '0x')
+
+
+def test_nonces_are_read_once_and_allocated_in_order(tmp_path):
+    provider = StubNonceProvider(5)
+    manager = NonceManager(TransactionJournal(str(tmp_path / 'journal.sqlite')))
+
+    assert [manager.allocate(WALLET, Web3(provider)) for _ in range(3)] == [5, 6, 7]
+    assert provider.requests == 1
+    assert manager.journal.next_nonce(WALLET) == 8
+
+
+def test_gaps_of_dropped_claims_are_reused_first(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.sqlite'))
+    # a previous run sent nonces 5 to 8, 6 is still in flight and the node only counts 5
+    journal.store_next_nonce(WALLET, 9)
+    journal_claim(journal, 6)
+    manager = NonceManager(journal)
+    manager.sync(WALLET, 5)
+
+    web3 = Web3(StubNonceProvider(5))
+    assert [manager.allocate(WALLET, web3) for _ in range(4)] == [5, 7, 8, 9]
+
+
+def test_released_nonce_is_allocated_again(tmp_path):
+    manager = NonceManager(TransactionJournal(str(tmp_path / 'journal.sqlite')))
+    web3 = Web3(StubNonceProvider(5))
+    first, second = manager.allocate(WALLET, web3), manager.allocate(WALLET, web3)
+    manager.release(WALLET, first)
+
+    assert manager.allocate(WALLET, web3) == first
+    assert manager.allocate(WALLET, web3) == second + 1
+
+
+def test_invalidated_wallet_is_synced_again_on_allocate(tmp_path):
+    provider = StubNonceProvider(5)
+    manager = NonceManager(TransactionJournal(str(tmp_path / 'journal.sqlite')))
+    manager.sync(WALLET, 5)
+    assert manager.allocate(WALLET, Web3(provider)) == 5
+    assert provider.requests == 0
+
+    # another tool sent transactions from the wallet, the node refused the next nonce as too low
+    manager.invalidate(WALLET)
+    provider.pending_count = 12
+    assert not manager.is_synced(WALLET)
+    assert manager.allocate(WALLET, Web3(provider)) == 12
+    assert provider.requests == 1 and manager.is_synced(WALLET)
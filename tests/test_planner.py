@@ -0,0 +1,69 @@
+from eth_account import Account
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from contracts import get_contract
+from planner import plan_claim_batches
+
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+SPONSORSHIPS = [Web3.to_checksum_address('0x{:040x}'.format(0x5b << 152 | index)) for index in range(16)]
+BASE_GAS = 60000
+SPONSORSHIP_GAS = 40000
+
+
+class StubEstimateProvider(BaseProvider):
+    """Stand-in for a node estimating claims at BASE_GAS plus SPONSORSHIP_GAS each, reverting on `reverting`."""
+
+    def __init__(self, reverting: set = frozenset()):
+        self.reverting = reverting
+        self.batches = []
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        self.batches.append(calls)
+        contract = get_contract(Web3(self), 'operator', OPERATOR)
+        results = []
+        for method, (transaction,) in calls:
+            assert method == 'eth_estimateGas'
+            _, arguments = contract.decode_function_input(transaction['data'])
+            sponsorships = [Web3.to_checksum_address(address) for address in arguments['sponsorshipAddresses']]
+            if self.reverting & set(sponsorships):
+                results.append(ValueError({'code': -32000, 'message': 'execution reverted: NoEarnings'}))
+            else:
+                results.append(hex(BASE_GAS + SPONSORSHIP_GAS * len(sponsorships)))
+        return results
+
+
+def plan(provider: StubEstimateProvider, sponsorships: list, gas_budget: int) -> tuple:
+    web3 = Web3(provider)
+    return plan_claim_batches(web3, get_contract(web3, 'operator', OPERATOR), Account.create(), sponsorships,
+                              gas_budget)
+
+
+def test_claim_under_budget_is_estimated_once():
+    provider = StubEstimateProvider()
+    batches, rejected = plan(provider, SPONSORSHIPS, 3000000)
+
+    assert batches == [(SPONSORSHIPS, BASE_GAS + 16 * SPONSORSHIP_GAS)] and rejected == []
+    assert len(provider.batches) == 1
+
+
+def test_reverting_sponsorship_is_rejected_and_the_others_claimed_together():
+    provider = StubEstimateProvider(reverting={SPONSORSHIPS[5]})
+    batches, rejected = plan(provider, SPONSORSHIPS, 3000000)
+
+    assert rejected == [SPONSORSHIPS[5]]
+    survivors = SPONSORSHIPS[:5] + SPONSORSHIPS[6:]
+    assert batches == [(survivors, BASE_GAS + 15 * SPONSORSHIP_GAS)]
+    # 5 bisection levels and one estimate of the repacked claim
+    assert len(provider.batches) == 6 and len(provider.batches[-1]) == 1
+
+
+def test_claims_stay_under_budget_once_repacked():
+    provider = StubEstimateProvider(reverting={SPONSORSHIPS[0]})
+    gas_budget = BASE_GAS + 6 * SPONSORSHIP_GAS
+    batches, rejected = plan(provider, SPONSORSHIPS, gas_budget)
+
+    assert rejected == [SPONSORSHIPS[0]]
+    assert [sponsorship for batch, _ in batches for sponsorship in batch] == SPONSORSHIPS[1:]
+    assert all(gas_estimate <= gas_budget for _, gas_estimate in batches)
+    assert len(batches) == 3
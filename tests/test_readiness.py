@@ -0,0 +1,86 @@
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+from web3.providers import BaseProvider
+
+from contracts import get_contract
+from readiness import INSUFFICIENT, READY, UNKNOWN, check_wallets
+
+OPERATORS = [Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152 | index)) for index in range(3)]
+WALLETS = [Web3.to_checksum_address('0x{:040x}'.format(0x0c << 152 | index)) for index in range(3)]
+SPONSORSHIPS = [Web3.to_checksum_address('0x{:040x}'.format(0x5b << 152 | index)) for index in range(2)]
+REVERTED = ValueError({'code': -32000, 'message': 'execution reverted'})
+
+
+class StubNodeProvider(BaseProvider):
+    """Stand-in for a node answering the readiness batch, failing the reads of `failing` operators and wallets."""
+
+    def __init__(self, balances: dict, failing: set = frozenset()):
+        self.balances = balances
+        self.failing = failing
+        self.batches = []
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        self.batches.append(calls)
+        results = [self.answer(method, params) for method, params in calls]
+        errors = [result for result in results if isinstance(result, ValueError)]
+        if raise_errors and errors:
+            raise errors[0]
+        return results
+
+    def answer(self, method: str, params: list):
+        if method == 'eth_feeHistory':
+            blocks = int(params[0], 16)
+            return {'oldestBlock': hex(100), 'baseFeePerGas': [hex(100 * 10 ** 9)] * (blocks + 1),
+                    'reward': [[hex(30 * 10 ** 9)]] * blocks}
+        if method == 'eth_chainId':
+            return hex(137)
+        if method == 'eth_call':
+            return self.call(Web3.to_checksum_address(params[0]['to']), params[0]['data'])
+        if params[0] in self.failing:
+            return ValueError({'code': -32000, 'message': 'header not found'})
+        if method == 'eth_getBalance':
+            return hex(self.balances[params[0]])
+        return hex(7 if params[1] == 'pending' else 5)
+
+    def call(self, target: str, data: str) -> str:
+        if target in self.failing:
+            return REVERTED
+        web3 = Web3(self)
+        contract = get_contract(web3, 'operator', target)
+        function, _ = contract.decode_function_input(data)
+        value = {
+            'getSponsorshipsAndEarnings': (SPONSORSHIPS, [2 * 10 ** 18, 0], 100 * 10 ** 18),
+            'queueCurrentIndex': 3,
+            'queueLastIndex': 5,
+        }[function.fn_name]
+        return Web3.to_hex(web3.codec.encode(get_abi_output_types(function.abi),
+                                             value if isinstance(value, tuple) else (value,)))
+
+
+def operators() -> list:
+    return [{'operator_contract_adress': operator} for operator in OPERATORS]
+
+
+def test_wallets_checked_in_one_batch_with_operator_contexts():
+    provider = StubNodeProvider({WALLETS[0]: 10 * 10 ** 18, WALLETS[1]: 10 ** 17})
+    reports = check_wallets(Web3(provider), operators(), [WALLETS[0], WALLETS[0], WALLETS[1]])
+
+    assert len(provider.batches) == 1
+    assert [report['status'] for report in reports] == [READY, INSUFFICIENT]
+    assert reports[0]['operators'] == OPERATORS[:2] and reports[0]['nonce'] == 7
+    assert reports[0]['pending_transactions'] == 2
+    context = reports[0]['contexts'][OPERATORS[1]]
+    assert context['balance'] == 10 * 10 ** 18 and context['chain_id'] == 137 and context['queue_length'] == 2
+    assert context['earnings'] == {SPONSORSHIPS[0]: 2 * 10 ** 18, SPONSORSHIPS[1]: 0}
+
+
+def test_failed_reads_only_affect_their_operator_and_wallet():
+    provider = StubNodeProvider({WALLETS[0]: 10 * 10 ** 18, WALLETS[1]: 10 * 10 ** 18},
+                                failing={OPERATORS[1], WALLETS[2]})
+    reports = check_wallets(Web3(provider), operators(), WALLETS)
+
+    ready, failed_operator, unknown = reports
+    assert ready['status'] == READY and list(ready['contexts']) == [OPERATORS[0]]
+    assert failed_operator['status'] == READY and failed_operator['contexts'] == {}
+    assert list(failed_operator['failed_operators']) == [OPERATORS[1]]
+    assert unknown['status'] == UNKNOWN and unknown['nonce'] is None and unknown['contexts'] == {}
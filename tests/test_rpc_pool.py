@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rpc import PooledHTTPProvider
+
+
+class StandInEndpoint:
+    """JSON-RPC endpoint answering eth_blockNumber after `delay` seconds, or with HTTP `status` when set."""
+
+    def __init__(self, delay: float = 0, status: int = 200, result='0x10'):
+        self.delay = delay
+        self.status = status
+        self.result = result
+        self.hits = 0
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                endpoint.hits += 1
+                time.sleep(endpoint.delay)
+                if endpoint.status != 200:
+                    self.send_response(endpoint.status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                response = {'jsonrpc': '2.0', 'id': request['id']}
+                if isinstance(endpoint.result, dict):
+                    response.update(endpoint.result)
+                else:
+                    response['result'] = endpoint.result
+                content = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+
+@pytest.fixture
+def endpoints():
+    started = []
+
+    def start(**behaviour) -> StandInEndpoint:
+        started.append(StandInEndpoint(**behaviour))
+        return started[-1]
+
+    yield start
+    for endpoint in started:
+        endpoint.server.shutdown()
+
+
+def timed_read(provider: PooledHTTPProvider) -> float:
+    started_at = time.monotonic()
+    assert provider.make_request('eth_blockNumber', [])['result'] == '0x10'
+    return time.monotonic() - started_at
+
+
+def test_reads_move_to_the_fast_endpoint_while_the_slow_one_is_in_flight(endpoints):
+    slow, limited, fast = endpoints(delay=2), endpoints(status=429), endpoints(delay=0.05)
+    provider = PooledHTTPProvider([slow.url, limited.url, fast.url], hedge_delay=0.3)
+
+    # the slow endpoint is tried first, hedged after 0.3s to the rate limited one, then the fast one
+    assert timed_read(provider) < 1
+    latencies = [timed_read(provider) for _ in range(10)]
+
+    assert max(latencies) < 0.25
+    assert slow.hits == 1 and limited.hits == 1 and fast.hits == 11
+
+
+def test_hung_endpoints_do_not_starve_later_hedges(endpoints):
+    hung = [endpoints(delay=3) for _ in range(2)]
+    fast = endpoints(delay=0.01)
+    provider = PooledHTTPProvider([endpoint.url for endpoint in hung] + [fast.url], pool_size=1, hedge_delay=0.1)
+
+    reads = [threading.Thread(target=timed_read, args=(provider,)) for _ in range(4)]
+    started_at = time.monotonic()
+    for read in reads:
+        read.start()
+    for read in reads:
+        read.join()
+
+    assert time.monotonic() - started_at < 1.5
+    assert fast.hits >= 4
+
+
+def test_broadcast_returns_the_accepted_transaction(endpoints):
+    known = endpoints(result={'error': {'code': -32000, 'message': 'already known'}})
+    relaying = endpoints(delay=0.05, result='0xabc')
+    failing = endpoints(status=500)
+    provider = PooledHTTPProvider([known.url, relaying.url, failing.url])
+
+    response = provider.make_request('eth_sendRawTransaction', ['0x00'])
+
+    assert response['result'] == '0xabc'
+    assert known.hits == relaying.hits == failing.hits == 1
@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+from journal import TransactionJournal
+from scheduler import SECONDS_PER_YEAR, fit_accrual_rates, harvest_window, plan_harvests
+
+HOUR = 3600
+OPERATOR = '0x0a00000000000000000000000000000000000000'
+SPONSORSHIP_A = '0x5b00000000000000000000000000000000000000'
+SPONSORSHIP_B = '0x5b00000000000000000000000000000000000001'
+SPONSORSHIP_C = '0x5b00000000000000000000000000000000000002'
+CFG = {'data_price_in_matic': 0.5, 'earnings_yield': 0.1, 'schedule_tolerance': 0.1, 'max_allowed_earnings_margin': 0.9}
+
+
+def recorded_samples(tmp_path) -> list:
+    """Hourly samples: A accrues 10 wei/s, B 20 wei/s and is claimed between hours 2 and 3, C shows up at hour 3."""
+    journal = TransactionJournal(str(tmp_path / 'journal.sqlite'))
+    for hour in range(6):
+        earnings = {SPONSORSHIP_A: 10 * hour * HOUR, SPONSORSHIP_B: 20 * (hour if hour < 3 else hour - 3) * HOUR}
+        if hour >= 3:
+            earnings[SPONSORSHIP_C] = 5 * (hour - 3) * HOUR
+        journal.record_earnings(OPERATOR, earnings, hour * HOUR, keep_seconds=7 * 24 * HOUR)
+    return journal.earnings_samples(OPERATOR)
+
+
+def test_fit_accrual_rates_from_recorded_samples(tmp_path):
+    rates = fit_accrual_rates(recorded_samples(tmp_path))
+    assert rates == {SPONSORSHIP_A: 10, SPONSORSHIP_B: 20, SPONSORSHIP_C: 5}
+
+
+def test_fit_accrual_rates_needs_two_samples():
+    assert fit_accrual_rates([]) == {}
+    assert fit_accrual_rates([(0, {SPONSORSHIP_A: 100})]) == {}
+
+
+def test_harvest_window_balances_gas_and_idle_earnings():
+    claim_cost, rate, holding_cost, tolerance = 10 ** 16, 10 ** 14, 1e-9, 0.1
+    shortest, optimum, longest = harvest_window(claim_cost, rate, holding_cost, tolerance)
+
+    def cost_rate(interval: float) -> float:
+        return claim_cost / interval + holding_cost * rate * interval / 2
+
+    assert optimum == pytest.approx(math.sqrt(2 * claim_cost / (holding_cost * rate)))
+    assert shortest < optimum < longest
+    assert cost_rate(shortest) == pytest.approx((1 + tolerance) * cost_rate(optimum))
+    assert cost_rate(longest) == pytest.approx((1 + tolerance) * cost_rate(optimum))
+
+
+def test_plan_harvests_groups_overlapping_windows():
+    claim_cost = 10 ** 16
+    holding_cost = CFG['earnings_yield'] / SECONDS_PER_YEAR * CFG['data_price_in_matic']
+    rates = {SPONSORSHIP_A: 10 ** 12, SPONSORSHIP_B: 1.05 * 10 ** 12, SPONSORSHIP_C: 10 ** 10}
+    earnings = {sponsorship: 0 for sponsorship in rates}
+
+    claims = plan_harvests(CFG, rates, earnings, 10 ** 30, claim_cost, now=0)
+
+    assert [claim['sponsorships'] for claim in claims] == [[SPONSORSHIP_B, SPONSORSHIP_A], [SPONSORSHIP_C]]
+    # the shared claim happens at the end of the earliest window it covers
+    assert claims[0]['claim_at'] == pytest.approx(harvest_window(claim_cost, rates[SPONSORSHIP_B], holding_cost,
+                                                                 CFG['schedule_tolerance'])[2])
+    assert claims[0]['expected_earnings'] == pytest.approx(sum(rates[sponsorship] * claims[0]['claim_at']
+                                                               for sponsorship in claims[0]['sponsorships']))
+
+
+def test_plan_harvests_claims_before_max_allowed_earnings():
+    rates = {SPONSORSHIP_A: 10 ** 15}
+    max_allowed_earnings = 10 ** 18
+
+    claims = plan_harvests(CFG, rates, {SPONSORSHIP_A: 4 * 10 ** 17}, max_allowed_earnings, 10 ** 16, now=1000)
+
+    # 0.9 of maxAllowedEarnings is reached 900s after the last claim, which was 400s ago
+    assert claims[0]['claim_at'] == pytest.approx(1000 + 900 - 400)
+    assert claims[0]['expected_earnings'] == pytest.approx(0.9 * max_allowed_earnings)
+
+
+def test_plan_harvests_requires_data_price():
+    with pytest.raises(ValueError, match='data_price_in_matic'):
+        plan_harvests({}, {SPONSORSHIP_A: 10 ** 12}, {SPONSORSHIP_A: 0}, 10 ** 30, 10 ** 16, now=0)
@@ -0,0 +1,117 @@
+import math
+
+import pytest
+from eth_account._utils.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+from web3.providers import BaseProvider
+
+from journal import MINED, REPLACED, TransactionJournal
+from tx_manager import TransactionManager
+
+PRIVATE_KEY = '0x{:064x}'.format(1)
+OPERATOR = Web3.to_checksum_address('0x{:040x}'.format(0x0a << 152))
+GWEI = 10 ** 9
+
+
+class StubMempoolProvider(BaseProvider):
+    """
+    Stand-in for a node whose block number moves on at every poll and which only mines transactions paying at
+    least `min_priority_fee`, refusing replacements that do not bump both fees by 10%.
+    """
+
+    def __init__(self, min_priority_fee: int):
+        self.min_priority_fee = min_priority_fee
+        self.block_number = 100
+        self.sent = {}
+        self.receipts = {}
+
+    def make_request(self, method: str, params: list) -> dict:
+        return {'jsonrpc': '2.0', 'id': 1, 'result': self.answer(method, params)}
+
+    def batch_request(self, calls: list, raise_errors: bool = True) -> list:
+        self.block_number += 1
+        for tx_hash, transaction in self.sent.items():
+            if transaction['maxPriorityFeePerGas'] >= self.min_priority_fee and not self.receipts:
+                self.receipts[tx_hash] = self.receipt(tx_hash)
+        return [self.answer(method, params) for method, params in calls]
+
+    def answer(self, method: str, params: list):
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_getTransactionReceipt':
+            return self.receipts.get(params[0])
+        assert method == 'eth_sendRawTransaction'
+        transaction = TypedTransaction.from_bytes(HexBytes(params[0])).as_dict()
+        for sent in self.sent.values():
+            if sent['nonce'] == transaction['nonce'] and (
+                    transaction['maxFeePerGas'] < sent['maxFeePerGas'] * 1.1
+                    or transaction['maxPriorityFeePerGas'] < sent['maxPriorityFeePerGas'] * 1.1):
+                raise ValueError({'code': -32000, 'message': 'replacement transaction underpriced'})
+        tx_hash = Web3.keccak(hexstr=params[0]).hex()
+        self.sent[tx_hash] = transaction
+        return tx_hash
+
+    def receipt(self, tx_hash: str) -> dict:
+        return {
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockNumber': hex(self.block_number),
+            'blockHash': '0x' + '00' * 32, 'from': OPERATOR, 'to': OPERATOR, 'cumulativeGasUsed': hex(21000),
+            'gasUsed': hex(21000), 'effectiveGasPrice': hex(50 * GWEI), 'contractAddress': None, 'logs': [],
+            'logsBloom': '0x' + '00' * 256, 'status': '0x1', 'type': '0x2',
+        }
+
+
+def transaction(nonce: int = 0) -> dict:
+    return {'from': Web3().eth.account.from_key(PRIVATE_KEY).address, 'to': OPERATOR, 'value': 0, 'data': '0x',
+            'chainId': 137, 'gas': 100000, 'maxFeePerGas': 100 * GWEI, 'maxPriorityFeePerGas': 30 * GWEI,
+            'nonce': nonce}
+
+
+def manager(provider: StubMempoolProvider, journal: TransactionJournal = None, **settings) -> TransactionManager:
+    cfg = {'operator_contract_adress': OPERATOR, 'replace_after_blocks': 2, 'tx_poll_interval': 0, 'tx_timeout': 1,
+           **settings}
+    return TransactionManager(Web3(provider), cfg, PRIVATE_KEY, journal=journal)
+
+
+def test_stuck_transaction_is_replaced_with_bumped_fees_and_the_same_nonce(tmp_path):
+    provider = StubMempoolProvider(min_priority_fee=40 * GWEI)
+    journal = TransactionJournal(str(tmp_path / 'journal.sqlite'))
+    transaction_manager = manager(provider, journal)
+    transaction_manager.submit(transaction(nonce=4), block_number=provider.block_number)
+
+    receipt = transaction_manager.wait()
+
+    attempts = transaction_manager.attempts
+    # 30 gwei bumped by 12.5% three times pays the 40 gwei the node requires
+    assert [attempt['maxPriorityFeePerGas'] for attempt in attempts] == [30 * GWEI, 33750000000, 37968750000,
+                                                                          42714843750]
+    assert {attempt['nonce'] for attempt in attempts} == {4}
+    assert all(later['block'] - earlier['block'] >= 2 for earlier, later in zip(attempts, attempts[1:]))
+    assert receipt['transactionHash'].hex() == attempts[-1]['tx_hash']
+    statuses = {row['tx_hash']: row['status']
+                for row in journal.connection.execute("SELECT tx_hash, status FROM transactions")}
+    assert statuses == {**{attempt['tx_hash']: REPLACED for attempt in attempts[:-1]},
+                        attempts[-1]['tx_hash']: MINED}
+
+
+def test_bump_below_what_nodes_accept_is_raised_to_ten_percent():
+    provider = StubMempoolProvider(min_priority_fee=33 * GWEI)
+    transaction_manager = manager(provider, fee_bump_percent=5)
+    transaction_manager.submit(transaction(), block_number=provider.block_number)
+
+    transaction_manager.wait()
+
+    assert len(transaction_manager.attempts) == 2
+    assert transaction_manager.attempts[1]['maxPriorityFeePerGas'] == math.ceil(30 * GWEI * 1.101)
+
+
+def test_no_replacement_over_the_cost_cap():
+    provider = StubMempoolProvider(min_priority_fee=40 * GWEI)
+    # 100000 gas at 100 gwei is 0.01 MATIC, the first bump would exceed the cap
+    transaction_manager = manager(provider, max_tx_cost_matic=0.0105, tx_timeout=0.2)
+    transaction_manager.submit(transaction(), block_number=provider.block_number)
+
+    with pytest.raises(TimeExhausted):
+        transaction_manager.wait()
+    assert len(transaction_manager.attempts) == 1 and len(provider.sent) == 1
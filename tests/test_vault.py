@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from vault import VaultCredentialProvider, VaultError
+
+
+class StubVault:
+    """Userpass logins handing out a new token each time, and KV v2 reads refused with 403 for revoked tokens."""
+
+    def __init__(self, lease_duration: int = 3600):
+        self.lease_duration = lease_duration
+        self.logins = 0
+        self.revoked = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, status: int, body: dict):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                stub.logins += 1
+                self.send_json(200, {'auth': {'client_token': 'token{}'.format(stub.logins),
+                                              'lease_duration': stub.lease_duration, 'renewable': False}})
+
+            def do_GET(self):
+                if self.headers['X-Vault-Token'] in stub.revoked:
+                    self.send_json(403, {'errors': ['permission denied']})
+                    return
+                self.send_json(200, {'lease_duration': 0, 'data': {'data': {'key': 'secret'}}})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def cfg(self, **settings) -> dict:
+        return dict({'vault_address': 'http://127.0.0.1:{}'.format(self.server.server_address[1]),
+                     'vault_username': 'harvest', 'vault_mount_point': 'secret', 'vault_secret_path': 'harvest',
+                     'vault_key': 'key', 'vault_secret_ttl': 0}, **settings)
+
+
+@pytest.fixture
+def stub_vault():
+    vault = StubVault()
+    yield vault
+    vault.server.shutdown()
+
+
+def test_revoked_token_from_file_logs_in_again(stub_vault, tmp_path):
+    token_file = str(tmp_path / 'token')
+    with open(token_file, 'w') as stream:
+        json.dump({'token': 'revoked', 'expires_at': time.time() + 3600, 'renewable': False}, stream)
+    stub_vault.revoked.add('revoked')
+
+    provider = VaultCredentialProvider(stub_vault.cfg(vault_token_file=token_file))
+
+    assert provider.read_secret(stub_vault.cfg()) == 'secret'
+    assert stub_vault.logins == 1
+    with open(token_file, 'r') as stream:
+        assert json.load(stream)['token'] == 'token1'
+
+
+def test_refused_token_after_login_raises(stub_vault):
+    provider = VaultCredentialProvider(stub_vault.cfg())
+    stub_vault.revoked.update({'token1', 'token2'})
+
+    with pytest.raises(VaultError) as error:
+        provider.read_secret(stub_vault.cfg())
+    assert error.value.status_code == 403
+    assert stub_vault.logins == 2
+
+
+def test_token_without_ttl_never_expires(stub_vault):
+    stub_vault.lease_duration = 0
+    provider = VaultCredentialProvider(stub_vault.cfg())
+
+    for _ in range(3):
+        assert provider.read_secret(stub_vault.cfg()) == 'secret'
+    assert stub_vault.logins == 1
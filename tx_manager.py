@@ -0,0 +1,133 @@
+import json
+import logging
+import math
+import time
+
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from journal import MINED, FAILED
+from metrics import TIME_TO_INCLUSION
+
+
+class TransactionManager:
+    """
+    Send a transaction and watch it until one of its versions is mined. When it is still pending
+    `replace_after_blocks` blocks after the last send, it is re-signed with the same nonce and fees bumped by
+    `fee_bump_percent`, as long as its maximum cost stays under `max_tx_cost_matic`. Every version sent is
+    recorded in `attempts` and, when a journal is given, in the journal so that a later run can resume it.
+    """
+
+    def __init__(self, web3: Web3, cfg: dict, wallet_private_key: str, journal=None, sponsorships: list = None):
+        self.web3 = web3
+        self.wallet_private_key = wallet_private_key
+        self.account = web3.eth.account.from_key(wallet_private_key)
+        self.operator = cfg['operator_contract_adress']
+        self.journal = journal
+        self.sponsorships = sponsorships or []
+        self.replace_after_blocks = cfg.get('replace_after_blocks', 10)
+        # nodes refuse a replacement under a 10% bump of both fees
+        self.fee_bump = max(cfg.get('fee_bump_percent', 12.5), 10.1) / 100
+        self.max_tx_cost = int(cfg.get('max_tx_cost_matic', 1) * 10 ** 18)
+        self.poll_interval = cfg.get('tx_poll_interval', 2)
+        self.timeout = cfg.get('tx_timeout', 600)
+        self.attempts = []
+        self.transaction = None
+        self.first_sent_at = None
+
+    def _record(self, tx_hash: str, transaction: dict, block_number: int):
+        self.attempts.append({'tx_hash': tx_hash, 'nonce': transaction['nonce'], 'block': block_number,
+                              'maxFeePerGas': transaction['maxFeePerGas'],
+                              'maxPriorityFeePerGas': transaction['maxPriorityFeePerGas']})
+
+    def _send(self, transaction: dict, block_number: int):
+        signed_transaction = self.web3.eth.account.sign_transaction(transaction, self.wallet_private_key)
+        tx_hash = signed_transaction.hash.hex()
+        if self.journal:
+            # journaled before sending: a crash right after the send still leaves a trace of the claim
+            self.journal.record(tx_hash, self.operator, self.account.address, self.sponsorships, transaction,
+                                signed_transaction.rawTransaction.hex())
+        try:
+            self.web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+        except ValueError:
+            if self.journal:
+                self.journal.discard(tx_hash)
+            raise
+        self._record(tx_hash, transaction, block_number)
+        self.first_sent_at = self.first_sent_at or time.time()
+
+    def bump_fees(self, transaction: dict):
+        """Return `transaction` with bumped fees, or None when that would exceed the cost cap."""
+        max_fee = math.ceil(transaction['maxFeePerGas'] * (1 + self.fee_bump))
+        if max_fee * transaction['gas'] > self.max_tx_cost:
+            return None
+        return dict(transaction, maxFeePerGas=max_fee,
+                    maxPriorityFeePerGas=math.ceil(transaction['maxPriorityFeePerGas'] * (1 + self.fee_bump)))
+
+    def _poll(self) -> tuple:
+        calls = [('eth_blockNumber', [])] + [('eth_getTransactionReceipt', [attempt['tx_hash']])
+                                             for attempt in self.attempts]
+        block_number, *receipts = self.web3.provider.batch_request(calls)
+        mined = next((attempt['tx_hash'] for attempt, receipt in zip(self.attempts, receipts) if receipt), None)
+        return int(block_number, 16), mined
+
+    def submit(self, transaction: dict, block_number: int = None):
+        """Send `transaction` without waiting for it, `wait` watches it later."""
+        self.transaction = transaction
+        self._send(transaction, self.web3.eth.block_number if block_number is None else block_number)
+
+    def wait(self):
+        return self._watch(self.transaction)
+
+    def send(self, transaction: dict):
+        self.submit(transaction)
+        return self.wait()
+
+    def resume(self, journal_rows: list):
+        """Watch the journaled versions of an in-flight claim, rebroadcasting the last one in case it was evicted."""
+        block_number = self.web3.eth.block_number
+        for row in journal_rows:
+            self._record(row['tx_hash'], json.loads(row['transaction_json']), block_number)
+        self.first_sent_at = journal_rows[0]['created_at']
+        try:
+            self.web3.eth.send_raw_transaction(journal_rows[-1]['raw_transaction'])
+        except ValueError as error:
+            # "already known" when still in the mempool, "nonce too low" when mined
+            logging.debug("Rebroadcast of {} refused: {}".format(journal_rows[-1]['tx_hash'], error))
+        return self._watch(json.loads(journal_rows[-1]['transaction_json']))
+
+    def _watch(self, transaction: dict):
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < self.timeout:
+            time.sleep(self.poll_interval)
+            block_number, mined = self._poll()
+            if mined:
+                receipt = self.web3.eth.get_transaction_receipt(mined)
+                TIME_TO_INCLUSION.labels(self.operator).observe(time.time() - self.first_sent_at)
+                if self.journal:
+                    self.journal.resolve(self.account.address, transaction['nonce'], mined,
+                                         MINED if receipt['status'] == 1 else FAILED)
+                return receipt
+            if block_number - self.attempts[-1]['block'] < self.replace_after_blocks:
+                continue
+
+            replacement = self.bump_fees(transaction)
+            if replacement is None:
+                logging.warning("Transaction {} pending for {} blocks but a bump would exceed the {} MATIC cap".format(
+                    self.attempts[-1]['tx_hash'], block_number - self.attempts[-1]['block'],
+                    self.max_tx_cost / 10 ** 18))
+                self.attempts[-1]['block'] = block_number
+                continue
+            try:
+                self._send(replacement, block_number)
+            except ValueError as error:
+                # "nonce too low": a previous version has just been mined, the next poll finds its receipt
+                logging.warning("Replacement of {} refused: {}".format(self.attempts[-1]['tx_hash'], error))
+                self.attempts[-1]['block'] = block_number
+                continue
+            transaction = replacement
+            logging.info("Transaction stuck, replaced by {} with max fee {} gwei, priority fee {} gwei".format(
+                self.attempts[-1]['tx_hash'], transaction['maxFeePerGas'] / 10 ** 9,
+                transaction['maxPriorityFeePerGas'] / 10 ** 9))
+        raise TimeExhausted("Transactions {} not mined after {}s".format(
+            [attempt['tx_hash'] for attempt in self.attempts], self.timeout))
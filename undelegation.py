@@ -0,0 +1,103 @@
+import logging
+import threading
+
+from contracts import get_contract
+from journal import get_journal
+from nonce import get_nonce_manager
+from planner import estimate_claim_gas_request
+from rpc import eth_call_request
+from tx_manager import TransactionManager
+
+WITHDRAW = 'withdrawEarningsFromSponsorships'
+WITHDRAW_WITHOUT_QUEUE = 'withdrawEarningsFromSponsorshipsWithoutQueue'
+
+_max_iterations = {}
+_max_iterations_lock = threading.Lock()
+
+
+def queue_length_requests(contract) -> list:
+    return [eth_call_request(contract, 'queueCurrentIndex'), eth_call_request(contract, 'queueLastIndex')]
+
+
+def max_queue_payout_iterations(cfg: dict, contract) -> int:
+    """
+    Queue entries paid out by one withdraw or payOutQueue, `max_queue_payout_iterations` or else
+    maxQueuePayoutIterations of the StreamrConfig contract of the operator, read once per process. Only the cache is
+    locked, operators reading it at the same time each read it rather than waiting on each other.
+    """
+    if cfg.get('max_queue_payout_iterations'):
+        return cfg['max_queue_payout_iterations']
+    with _max_iterations_lock:
+        if contract.address in _max_iterations:
+            return _max_iterations[contract.address]
+    streamr_config = get_contract(contract.w3, 'streamr_config', contract.functions.streamrConfig().call())
+    max_iterations = streamr_config.functions.maxQueuePayoutIterations().call()
+    with _max_iterations_lock:
+        return _max_iterations.setdefault(contract.address, max_iterations)
+
+
+def choose_withdraw_functions(web3, cfg: dict, contract, account, batches: list, queue_length: int) -> list:
+    """
+    `batches` were planned with withdrawEarningsFromSponsorshipsWithoutQueue. Estimate the default withdraw, which also
+    pays out the undelegation queue, for every batch in one batch and keep it where it still fits `claim_gas_budget`.
+    Returns the batches as (sponsorships, gas estimate, withdraw function) and logs the gas saved.
+    """
+    gas_budget = cfg.get('claim_gas_budget', 3000000)
+    estimates = web3.provider.batch_request(
+        [estimate_claim_gas_request(contract, account, batch, WITHDRAW) for batch, _ in batches], raise_errors=False)
+    chosen, saved = [], 0
+    for (batch, without_queue_estimate), estimate in zip(batches, estimates):
+        if not isinstance(estimate, ValueError) and int(estimate, 16) <= gas_budget:
+            chosen.append((batch, int(estimate, 16), WITHDRAW))
+            continue
+        chosen.append((batch, without_queue_estimate, WITHDRAW_WITHOUT_QUEUE))
+        if not isinstance(estimate, ValueError):
+            saved += int(estimate, 16) - without_queue_estimate
+    skipped = sum(function_name == WITHDRAW_WITHOUT_QUEUE for _, _, function_name in chosen)
+    logging.info("Undelegation queue of {} entries: {}/{} claims sent without queue payout, saving {} gas against "
+                 "{}".format(queue_length, skipped, len(chosen), saved, WITHDRAW))
+    return chosen
+
+
+def is_queue_payout_cheap(cfg: dict, gas_price: int) -> bool:
+    threshold = cfg.get('queue_payout_max_gas_price_gwei')
+    return threshold is not None and gas_price <= threshold * 10 ** 9
+
+
+def queue_payout_transaction(cfg: dict, contract, queue_length: int) -> tuple:
+    """payOutQueue bounded to maxQueuePayoutIterations entries, with the number of entries it pays out."""
+    iterations = min(queue_length, max_queue_payout_iterations(cfg, contract))
+    return contract.functions.payOutQueue(iterations), iterations
+
+
+def send_queue_payout(web3, cfg: dict, contract, account, wallet_private_key: str, context: dict, block_number: int):
+    """
+    Pay out the undelegation queue on its own transaction, bounded to maxQueuePayoutIterations entries, when the
+    expected gas price is at most `queue_payout_max_gas_price_gwei`. Returns the transaction manager and gas
+    estimate, or None when nothing was sent.
+    """
+    if not is_queue_payout_cheap(cfg, context['gas_price']):
+        return None
+    function, iterations = queue_payout_transaction(cfg, contract, context['queue_length'])
+    nonce_manager = get_nonce_manager(cfg)
+    nonce = nonce_manager.allocate(account.address, web3)
+    try:
+        gas_estimate = function.estimate_gas({'from': account.address})
+        transaction = function.build_transaction({
+            'from': account.address,
+            'chainId': context['chain_id'],
+            'gas': int(gas_estimate * cfg.get('gas_limit_multiplier', 1.5)),
+            'maxFeePerGas': context['fee_quote']['maxFeePerGas'],
+            'maxPriorityFeePerGas': context['fee_quote']['maxPriorityFeePerGas'],
+            'nonce': nonce,
+        })
+        transaction_manager = TransactionManager(web3, cfg, wallet_private_key, journal=get_journal(cfg),
+                                                 sponsorships=[])
+        transaction_manager.submit(transaction, block_number)
+    except ValueError as error:
+        nonce_manager.release(account.address, nonce)
+        logging.error("Queue payout of operator {} not sent: {}".format(contract.address, error))
+        return None
+    logging.info("Paying out {}/{} undelegation queue entries at {} gwei, {} gas".format(
+        iterations, context['queue_length'], context['gas_price'] / 10 ** 9, gas_estimate))
+    return transaction_manager, gas_estimate
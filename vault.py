@@ -1,38 +1,150 @@
-import sys
-
-import hvac
+import json
 import os
+import threading
+import time
+
 import requests
 import logging
 import certifi
 
-def get_vault_token(cfg: dict) -> str:
-    vault_address = cfg['vault_address']
-    username = cfg['vault_username']
-    password = os.getenv('VAULT_PASSWORD')
-    auth_payload = {
-        "password": password
-    }
-    ca_bundle = certifi.where()
-    auth_url = "{}/v1/auth/userpass/login/{}".format(vault_address, username)
-    response = requests.post(auth_url, json=auth_payload, verify=ca_bundle)
-
-    if response.status_code == 200:
+from metrics import VAULT_LATENCY
+
+
+class VaultError(Exception):
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class VaultCredentialProvider:
+    """
+    Vault access shared by every harvest of the process: one pooled session, the userpass token kept until its TTL
+    and renewed `vault_renew_margin` seconds before expiry, and secrets cached for their lease duration
+    (`vault_secret_ttl` for KV engines which do not lease). A token without TTL never expires. With
+    `vault_token_file` the token is also kept in a 0600 file so that cron runs reuse it, until Vault refuses it.
+    """
+
+    def __init__(self, cfg: dict):
+        self.vault_address = cfg['vault_address'].rstrip('/')
+        self.username = cfg['vault_username']
+        self.token_file = cfg.get('vault_token_file')
+        self.renew_margin = cfg.get('vault_renew_margin', 60)
+        self.secret_ttl = cfg.get('vault_secret_ttl', 3600)
+        self.session = requests.Session()
+        self.session.verify = certifi.where()
+        self._token = None
+        self._token_expires_at = 0
+        self._token_renewable = False
+        self._secrets = {}
+        self._lock = threading.Lock()
+        self._load_token_file()
+
+    def _request(self, operation: str, method: str, path: str, **kwargs) -> dict:
+        try:
+            with VAULT_LATENCY.labels(operation).time():
+                response = self.session.request(method, "{}/v1/{}".format(self.vault_address, path), **kwargs)
+        except requests.RequestException as error:
+            raise VaultError("Vault {} unreachable: {}".format(self.vault_address, error)) from error
+        if response.status_code != 200:
+            try:
+                status = response.json()
+            except ValueError:
+                status = response.text
+            raise VaultError("Status code: {} and status {}".format(response.status_code, status),
+                             status_code=response.status_code)
+        return response.json()
+
+    def _store_token(self, auth: dict):
+        self._token = auth['client_token']
+        # a lease duration of 0 is a token without TTL, e.g. a root or periodic token
+        lease_duration = auth.get('lease_duration', 0)
+        self._token_expires_at = time.time() + lease_duration if lease_duration else None
+        self._token_renewable = auth.get('renewable', False)
+        if self.token_file:
+            fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as stream:
+                json.dump({'token': self._token, 'expires_at': self._token_expires_at,
+                           'renewable': self._token_renewable}, stream)
+
+    def _load_token_file(self):
+        if not self.token_file or not os.path.exists(self.token_file):
+            return
+        try:
+            with open(self.token_file, 'r') as stream:
+                stored = json.load(stream)
+            self._token, self._token_expires_at = stored['token'], stored['expires_at']
+            self._token_renewable = stored.get('renewable', False)
+        except (ValueError, KeyError) as error:
+            logging.warning("Ignoring unreadable vault token file {}: {}".format(self.token_file, error))
+
+    def login(self):
+        payload = {"password": os.getenv('VAULT_PASSWORD')}
+        try:
+            response = self._request('login', 'POST', "auth/userpass/login/{}".format(self.username), json=payload)
+        except VaultError as error:
+            raise VaultError("Authentication failed. {}".format(error)) from error
         logging.info("Connected to vault")
-        token = response.json().get("auth", {}).get("client_token", "")
-        return token
-    else:
-        logging.fatal("Authentication failed. Status code: {} and status {}".format(response.status_code, response.json()))
-        sys.exit()
+        self._store_token(response['auth'])
+
+    def renew(self):
+        response = self._request('renew', 'POST', "auth/token/renew-self", headers={'X-Vault-Token': self._token})
+        logging.info("Vault token renewed")
+        self._store_token(response['auth'])
+
+    def token(self) -> str:
+        with self._lock:
+            if self._token and (self._token_expires_at is None
+                                or time.time() < self._token_expires_at - self.renew_margin):
+                return self._token
+            if self._token and self._token_renewable and time.time() < self._token_expires_at:
+                try:
+                    self.renew()
+                    return self._token
+                except VaultError as error:
+                    logging.warning("Vault token renewal failed, login again: {}".format(error))
+            self.login()
+            return self._token
+
+    def forget_token(self, token: str):
+        """Drop `token` after Vault refused it, e.g. revoked or expired earlier than stored, so the next use logs in."""
+        with self._lock:
+            if self._token == token:
+                self._token, self._token_expires_at, self._token_renewable = None, 0, False
+
+    def read_secret(self, cfg: dict) -> str:
+        secret_id = (cfg['vault_mount_point'], cfg['vault_secret_path'], cfg['vault_key'])
+        with self._lock:
+            cached = self._secrets.get(secret_id)
+        if cached and time.time() < cached[1]:
+            return cached[0]
+
+        path = "{}/data/{}".format(cfg['vault_mount_point'], cfg['vault_secret_path'])
+        token = self.token()
+        try:
+            response = self._request('read', 'GET', path, headers={'X-Vault-Token': token})
+        except VaultError as error:
+            if error.status_code != 403:
+                raise
+            logging.warning("Vault refused the stored token, login again: {}".format(error))
+            self.forget_token(token)
+            response = self._request('read', 'GET', path, headers={'X-Vault-Token': self.token()})
+        secret = response['data']['data'][cfg['vault_key']]
+        with self._lock:
+            self._secrets[secret_id] = (secret, time.time() + (response.get('lease_duration') or self.secret_ttl))
+        return secret
+
+
+_providers = {}
+_providers_lock = threading.Lock()
 
 
-def get_vault_secret(cfg: dict, token: str) -> str:
-    vault_client = hvac.Client(url=cfg['vault_address'], token=token)
-    private_key_response = vault_client.secrets.kv.read_secret_version(path=cfg['vault_secret_path'], mount_point=cfg['vault_mount_point'])
-    private_key = private_key_response['data']['data'][cfg['vault_key']]
-    return private_key
+def get_vault_provider(cfg: dict) -> VaultCredentialProvider:
+    key = (cfg['vault_address'], cfg['vault_username'])
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = VaultCredentialProvider(cfg)
+        return _providers[key]
 
 
 def get_privkey_from_vault(cfg: dict) -> str:
-    token = get_vault_token(cfg)
-    return get_vault_secret(cfg, token)
+    return get_vault_provider(cfg).read_secret(cfg)